@@ -0,0 +1,163 @@
+import uuid
+from datetime import date, timedelta
+
+from django.utils import timezone
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+
+HOLD_CACHE_ALIAS = 'holds'
+HOLD_TTL         = timedelta(minutes=10)
+MAX_HOLD_NIGHTS  = 30
+HOLD_HORIZON     = timedelta(days=180)
+
+def get_nights(start_date, end_date):
+    return [start_date+timedelta(days=stay) for stay in range((end_date - start_date).days)]
+
+def get_hold_window(today=None):
+    '''
+    hold 를 잡을 수 있는 [오늘, 오늘 + HOLD_HORIZON) 기간. 조회할 밤도 이 안으로 자른다.
+    '''
+    today = today or date.today()
+
+    return today, today + HOLD_HORIZON
+
+def get_held_stay_nights(stays):
+    '''
+    stays 를 hold 기간 안으로 잘라서 (accomodation_id, night) 로 펼친다. 숙소별로 겹치는 밤은 한 번만
+    숙소마다 최대 HOLD_HORIZON 일이라, 아무리 긴 기간을 물어도 조회할 키 수가 정해져 있다.
+    '''
+    window_start, window_end = get_hold_window()
+    nights                   = {}
+
+    for accomodation_id, start_date, end_date in stays:
+        for night in get_nights(max(start_date, window_start), min(end_date, window_end)):
+            nights[get_hold_night_key(accomodation_id, night)] = (accomodation_id, night)
+
+    return nights
+
+def get_hold_night_key(accomodation_id, night):
+    return f'bookings:hold:night:{accomodation_id}:{night.isoformat()}'
+
+def get_hold_key(hold_token):
+    return f'bookings:hold:{hold_token}'
+
+class HoldStore:
+    '''
+    결제 중인 (숙소, 밤)을 HOLD_TTL 동안 잡아 두는 저장소. 밤마다 키 하나를 cache.add 로 먼저 넣은 쪽만 성공한다.
+    settings.CACHES[HOLD_CACHE_ALIAS] 를 쓴다. 테스트와 단일 프로세스는 LocMemCache, 여러 프로세스면 redis/memcached 같은 공유 백엔드
+    '''
+    def __init__(self, alias=HOLD_CACHE_ALIAS):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def acquire(self, user_id, accomodation_id, start_date, end_date):
+        '''
+        (hold_token, expires_at) 반환. 한 밤이라도 다른 사용자가 잡고 있으면 잡은 밤을 되돌리고 ValidationError
+        같은 사용자가 이미 잡은 밤은 새 hold 로 넘겨받는다. 그 사이 만료된 밤은 add 로만 다시 잡고, 다른 사용자의 밤 위에 set 하지 않는다.
+        '''
+        nights                   = get_nights(start_date, end_date)
+        window_start, window_end = get_hold_window()
+
+        if not nights or len(nights) > MAX_HOLD_NIGHTS or start_date < window_start or end_date > window_end:
+            raise ValidationError('Invalid Date')
+
+        hold_token = uuid.uuid4().hex
+        expires_at = timezone.now() + HOLD_TTL
+        timeout    = HOLD_TTL.total_seconds()
+        value      = {'hold_token' : hold_token, 'user_id' : user_id, 'expires_at' : expires_at}
+        added      = []
+        taken_over = {}
+
+        for night in nights:
+            key = get_hold_night_key(accomodation_id, night)
+
+            if self.cache.add(key, value, timeout):
+                added.append(key)
+                continue
+
+            held = self.cache.get(key)
+
+            if held is None and self.cache.add(key, value, timeout):
+                added.append(key)
+                continue
+
+            if held is None or held['user_id'] != user_id:
+                self.rollback(added, taken_over)
+                raise ValidationError('Already Held Accomodation')
+
+            self.cache.set(key, value, timeout)
+            taken_over[key] = held
+
+        self.cache.set(get_hold_key(hold_token), {
+            'user_id'         : user_id,
+            'accomodation_id' : accomodation_id,
+            'start_date'      : start_date,
+            'end_date'        : end_date
+        }, timeout)
+
+        return hold_token, expires_at
+
+    def rollback(self, added, taken_over):
+        '''
+        acquire 가 실패하면 이번에 add 한 밤만 지우고, 이전 hold 에서 넘겨받은 밤은 원래 값과 남은 TTL 로 되돌린다.
+        '''
+        self.cache.delete_many(added)
+
+        for key, held in taken_over.items():
+            timeout = (held['expires_at'] - timezone.now()).total_seconds()
+
+            if timeout > 0:
+                self.cache.set(key, held, timeout)
+            else:
+                self.cache.delete(key)
+
+    def get(self, hold_token):
+        return self.cache.get(get_hold_key(hold_token))
+
+    def release(self, user_id, hold_token):
+        '''
+        hold_token 이 잡은 밤만 푼다. 그 사이 다른 hold 로 넘어간 밤은 그대로 둔다. 풀 hold 가 없으면 None
+        '''
+        hold = self.get(hold_token)
+
+        if hold is None or hold['user_id'] != user_id:
+            return None
+
+        keys = [get_hold_night_key(hold['accomodation_id'], night) for night in get_nights(hold['start_date'], hold['end_date'])]
+
+        self.cache.delete_many([key for key, held in self.cache.get_many(keys).items() if held['hold_token'] == hold_token])
+        self.cache.delete(get_hold_key(hold_token))
+
+        return hold
+
+    def release_stays(self, user_id, stays):
+        '''
+        stays : (accomodation_id, start_date, end_date) 리스트. 예약이 끝난 밤에 남은 user_id 의 hold 를 푼다.
+        '''
+        keys = list(get_held_stay_nights(stays))
+
+        self.cache.delete_many([key for key, held in self.cache.get_many(keys).items() if held['user_id'] == user_id])
+
+    def get_held_nights(self, stays, user_id=None):
+        '''
+        stays : (accomodation_id, start_date, end_date) 리스트
+        user_id 가 아닌 사용자가 잡은 밤을 {accomodation_id : [night, ...]} 로 돌려준다. get_many 한 번
+        '''
+        keys = get_held_stay_nights(stays)
+
+        held_nights = {accomodation_id : [] for accomodation_id, _, _ in stays}
+
+        for key, held in self.cache.get_many(list(keys)).items():
+            if held['user_id'] != user_id:
+                accomodation_id, night = keys[key]
+                held_nights[accomodation_id].append(night)
+
+        return held_nights
+
+    def is_held(self, stays, user_id=None):
+        return any(self.get_held_nights(stays, user_id).values())
+
+hold_store = HoldStore()
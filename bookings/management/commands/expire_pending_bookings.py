@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+from django.core.management.base import BaseCommand
+
+from planets.utils import bump_booking_generations
+from bookings.utils import expire_pending_bookings, PENDING_BOOKING_TTL
+
+class Command(BaseCommand):
+    help = '오래된 PENDING 예약을 배치 단위로 CANCELLED 로 바꿔 막혀 있던 날짜를 풀어준다. (주기적으로 실행)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=int(PENDING_BOOKING_TTL.total_seconds() // 60), help='이 시간(분)보다 오래된 PENDING 예약을 만료')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        expired_before = timezone.now() - timedelta(minutes=options['minutes'])
+        started_at     = time.perf_counter()
+        expired        = 0
+        batches        = 0
+
+        for stays in expire_pending_bookings(expired_before, options['batch_size']):
+            for accomodation_id, start_date, end_date in stays:
+                bump_booking_generations(accomodation_id, start_date, end_date)
+
+            expired += len(stays)
+            batches += 1
+
+        elapsed = time.perf_counter() - started_at
+
+        self.stdout.write(f'expired    : {expired}')
+        self.stdout.write(f'batches    : {batches}')
+        self.stdout.write(f'elapsed    : {elapsed*1000:.1f} ms')
+        self.stdout.write(f'throughput : {expired/elapsed if elapsed else 0:.0f} bookings/s')
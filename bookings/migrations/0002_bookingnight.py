@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_booking_nights(apps, schema_editor):
+    Booking      = apps.get_model('bookings', 'Booking')
+    BookingNight = apps.get_model('bookings', 'BookingNight')
+
+    for booking in Booking.objects.iterator():
+        BookingNight.objects.bulk_create([
+            BookingNight(
+                date            = booking.start_date+timedelta(days=night),
+                booking_id      = booking.id,
+                accomodation_id = booking.accomodation_id
+            ) for night in range((booking.end_date-booking.start_date).days)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planets', '0001_initial'),
+        ('bookings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('accomodation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='planets.accomodation')),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bookings.booking')),
+            ],
+            options={
+                'db_table': 'booking_nights',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bookingnight',
+            index=models.Index(fields=['accomodation', 'date'], name='booking_nights_acc_date_idx'),
+        ),
+        migrations.RunPython(backfill_booking_nights, migrations.RunPython.noop),
+    ]
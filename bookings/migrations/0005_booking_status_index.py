@@ -0,0 +1,17 @@
+# Generated by Django 4.0.3 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_bookingidempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['booking_status', 'created_at'], name='bookings_status_created_idx'),
+        ),
+    ]
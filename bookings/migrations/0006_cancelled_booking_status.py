@@ -0,0 +1,21 @@
+# Generated by Django 4.0.3 on 2026-10-18 17:20
+
+from django.db import migrations
+
+
+def create_cancelled_booking_status(apps, schema_editor):
+    BookingStatus = apps.get_model('bookings', 'BookingStatus')
+
+    # BookingStatusEnum.CANCELLED
+    BookingStatus.objects.get_or_create(id=4, defaults={'status' : 'CANCELLED'})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_booking_status_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cancelled_booking_status, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,22 @@
+from enum import Enum
+
 from django.db import models
 
 from core.models import TimeStamp
 
+class BookingStatusEnum(Enum):
+    PENDING   = 1
+    PAID      = 2
+    RESERVED  = 3
+    CANCELLED = 4
+
+class BookingQuerySet(models.QuerySet):
+    def active(self):
+        '''
+        취소되지 않은 예약 (예약 가능 여부 확인용)
+        '''
+        return self.exclude(booking_status_id=BookingStatusEnum.CANCELLED.value)
+
 class Booking(TimeStamp):
     booking_number     = models.UUIDField()
     start_date         = models.DateField()
@@ -15,11 +30,48 @@ class Booking(TimeStamp):
     planet             = models.ForeignKey('planets.Planet', on_delete=models.CASCADE)
     accomodation       = models.ForeignKey('planets.Accomodation', on_delete=models.CASCADE)
 
+    objects = BookingQuerySet.as_manager()
+
     class Meta:
         db_table = 'bookings'
+        indexes  = [
+            models.Index(fields=['accomodation', 'start_date', 'end_date'], name='bookings_acc_dates_idx'),
+            models.Index(fields=['user', 'start_date'], name='bookings_user_start_idx'),
+            models.Index(fields=['booking_status', 'created_at'], name='bookings_status_created_idx'),
+        ]
 
 class BookingStatus(models.Model):
     status = models.CharField(max_length=45)
 
     class Meta:
         db_table = 'booking_status'
+
+class BookingNight(models.Model):
+    '''
+    숙소별 예약된 밤 (check-in 포함, check-out 제외) 한 줄씩
+    '''
+    date         = models.DateField()
+    booking      = models.ForeignKey('Booking', on_delete=models.CASCADE)
+    accomodation = models.ForeignKey('planets.Accomodation', on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'booking_nights'
+        indexes  = [
+            models.Index(fields=['accomodation', 'date'], name='booking_nights_acc_date_idx'),
+        ]
+
+class BookingIdempotencyKey(TimeStamp):
+    '''
+    Idempotency-Key 헤더로 들어온 예약 요청의 처음 응답. 같은 키로 다시 오면 예약 테이블을 건드리지 않고 이 응답을 돌려준다.
+    '''
+    key          = models.CharField(max_length=64)
+    request_hash = models.CharField(max_length=32)
+    status_code  = models.PositiveSmallIntegerField()
+    response     = models.JSONField()
+    user         = models.ForeignKey('users.User', on_delete=models.CASCADE)
+
+    class Meta:
+        db_table    = 'booking_idempotency_keys'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='booking_idempotency_keys_user_key_uniq'),
+        ]
@@ -1,12 +1,16 @@
 from typing import OrderedDict
-from datetime import timedelta
 
-from django.db.models import Q
+from django.db import transaction
 from django.core.exceptions import ValidationError
 
 from rest_framework import serializers
 
+from planets.models import Accomodation
+from planets.utils import bump_booking_generations
+
+from .holds import hold_store
 from .models import Booking, BookingStatus
+from .utils import sync_booking_nights
 
 class BookingStatusSerializer(serializers.ModelSerializer):
     class Meta:
@@ -46,32 +50,56 @@ class BookingSerializer(serializers.Serializer):
         #     accomodation_id    = 1
         # )
         
-        q = Q()
-        
         plnaet_id       = validated_data.get('planet_id')
         accomodation_id = validated_data.get('accomodation_id')
         start_date      = validated_data.get('start_date')
         end_date        = validated_data.get('end_date')
 
-        q &= Q(accomodation_id=accomodation_id) & Q(planet_id=plnaet_id)
-        q &= Q(start_date__range=(start_date, end_date-timedelta(days=1)))\
-                 | Q(end_date__range=(start_date+timedelta(days=1), end_date))
+        # 숙소 row를 잠가 같은 숙소의 예약만 순서대로 처리한다. 다른 숙소 예약은 기다리지 않는다.
+        with transaction.atomic():
+            Accomodation.objects.select_for_update().only('id').get(id=accomodation_id, planet_id=plnaet_id)
+
+            if Booking.objects.active().filter(accomodation_id=accomodation_id, start_date__lt=end_date, end_date__gt=start_date).exists():
+                raise ValidationError(message="Already Booked Accomodation")
 
-        if not Booking.objects.filter(q):
             booking = Booking.objects.create(**validated_data)
-        
-        else:
-            raise ValidationError(message="Already Booked Accomodation")
+            sync_booking_nights(booking, created=True)
+            bump_booking_generations(booking.accomodation_id, booking.start_date, booking.end_date)
 
         return booking
     
     def update(self, obj : Booking, validated_data : OrderedDict):
+        '''
+        날짜를 바꾸면 create 와 같이 숙소 row를 잠그고, 이 예약을 뺀 나머지 예약과 겹치는지 확인한다.
+        다른 사용자가 결제 중(hold)인 밤으로는 옮길 수 없다.
+        '''
+        previous_dates = (obj.start_date, obj.end_date)
+
         obj.start_date         = validated_data.get('start_date', obj.start_date)
         obj.end_date           = validated_data.get('end_date', obj.end_date)
         obj.number_of_adults   = validated_data.get('number_of_adults', obj.number_of_adults)
         obj.number_of_children = validated_data.get('number_of_children', obj.number_of_children)
         obj.user_request       = validated_data.get('user_request', obj.user_request)
 
+        if obj.start_date >= obj.end_date:
+            raise ValidationError(message="Invalid Date")
+
+        with transaction.atomic():
+            if (obj.start_date, obj.end_date) != previous_dates:
+                if hold_store.is_held([(obj.accomodation_id, obj.start_date, obj.end_date)], obj.user_id):
+                    raise ValidationError(message="Already Held Accomodation")
+
+                Accomodation.objects.select_for_update().only('id').get(id=obj.accomodation_id)
+
+                if Booking.objects.active().filter(accomodation_id=obj.accomodation_id, start_date__lt=obj.end_date, end_date__gt=obj.start_date)\
+                                           .exclude(id=obj.id).exists():
+                    raise ValidationError(message="Already Booked Accomodation")
+
+            obj.save()
+            sync_booking_nights(obj)
+            bump_booking_generations(obj.accomodation_id, *previous_dates)
+            bump_booking_generations(obj.accomodation_id, obj.start_date, obj.end_date)
+
         return obj
 
 class BookingPostSchemaSerializer(serializers.Serializer):
@@ -84,6 +112,36 @@ class BookingPostSchemaSerializer(serializers.Serializer):
     plnet_id           = serializers.IntegerField()
     accomodation_id    = serializers.IntegerField()
 
+class BookingBulkPostSchemaSerializer(serializers.Serializer):
+    '''
+    Booking Bulk Post 스키마 시리얼라이저, 최대 10개 [Only Use Swagger]
+    '''
+    bookings = BookingPostSchemaSerializer(many=True)
+
+class BookingHoldPostSchemaSerializer(serializers.Serializer):
+    '''
+    Booking Hold Post 스키마 시리얼라이저 [Only Use Swagger]
+    '''
+    accomodation_id = serializers.IntegerField()
+    start_date      = serializers.DateField()
+    end_date        = serializers.DateField()
+
+class BookingHoldSchemaSerializer(serializers.Serializer):
+    '''
+    Booking Hold 응답 스키마 시리얼라이저 [Only Use Swagger]
+    '''
+    hold_token      = serializers.CharField()
+    accomodation_id = serializers.IntegerField()
+    start_date      = serializers.DateField()
+    end_date        = serializers.DateField()
+    expires_at      = serializers.DateTimeField()
+
+class BookingCancelSchemaSerializer(serializers.Serializer):
+    '''
+    Booking Delete 응답 스키마 시리얼라이저, 취소한 예약 수 [Only Use Swagger]
+    '''
+    cancelled = serializers.IntegerField()
+
 class BookingUpdateSchemaSerializer(serializers.Serializer):
     '''
     Booking Patch 스키마 시리얼라이저 [Only User Swagger]
@@ -6,6 +6,8 @@ class BookingSwaager:
     sort            = openapi.Parameter('sort', openapi.IN_QUERY, required=False, type=openapi.TYPE_STRING)
     offset          = openapi.Parameter('offset', openapi.IN_QUERY, required=False, type=openapi.TYPE_INTEGER)
     limit           = openapi.Parameter('limit', openapi.IN_QUERY, required=False, type=openapi.TYPE_INTEGER)
+    cursor          = openapi.Parameter('cursor', openapi.IN_QUERY, required=False, type=openapi.TYPE_STRING)
     planet_id       = openapi.Parameter('planet_id', openapi.IN_PATH, required=True, type=openapi.TYPE_INTEGER)
     accomodation_id = openapi.Parameter('accomodation_id', openapi.IN_PATH, required=True, type=openapi.TYPE_INTEGER)
-    booking_id      = openapi.Parameter('booking_id', openapi.IN_PATH, required=True, type=openapi.TYPE_INTEGER)
\ No newline at end of file
+    booking_id      = openapi.Parameter('booking_id', openapi.IN_PATH, required=True, type=openapi.TYPE_INTEGER)
+    hold_token      = openapi.Parameter('hold_token', openapi.IN_PATH, required=True, type=openapi.TYPE_STRING)
\ No newline at end of file
@@ -1,14 +1,32 @@
 import json
-from datetime import datetime, timedelta
+import threading
+from io import StringIO
+from uuid import uuid4
+from datetime import date, datetime, timedelta
+
+from unittest import mock
 
 import jwt
 import bcrypt
 
+from django.db import connection, IntegrityError
+from django.utils import timezone
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.test.utils import CaptureQueriesContext
+from django.test import TransactionTestCase, skipUnlessDBFeature
+from django.core.exceptions import ValidationError
+
 from rest_framework.test import APITestCase, APIClient
 
 from users.models import User
 from planets.models import Planet, Accomodation, Galaxy, PlanetTheme
-from bookings.models import BookingStatus, Booking
+from bookings.models import BookingStatus, Booking, BookingNight, BookingIdempotencyKey
+from bookings.serializers import BookingSerializer
+from bookings.holds import HoldStore, get_hold_night_key, HOLD_CACHE_ALIAS, HOLD_HORIZON, HOLD_TTL, MAX_HOLD_NIGHTS
+from bookings.utils import expire_pending_bookings, get_idempotency_record, sync_booking_nights, MAX_BULK_BOOKING_SIZE
+from core.utils import encode_cursor
 from starfolio.settings import SECRET_KEY, ALGORITHM
 
 class BookingTest(APITestCase):
@@ -216,6 +234,49 @@ class BookingTest(APITestCase):
             ]
         )
 
+    def test_success_booking_accomodation_list_with_cursor(self):
+        response = self.f_client.get('/api/bookings?my-stay=history&limit=2&cursor=')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([booking['id'] for booking in response.json()['results']], [2, 1])
+        self.assertIsNone(response.json()['prev'])
+
+        response = self.f_client.get(f'/api/bookings?my-stay=history&limit=2&cursor={response.json()["next"]}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([booking['id'] for booking in response.json()['results']], [3])
+        self.assertIsNone(response.json()['next'])
+
+        response = self.f_client.get(f'/api/bookings?my-stay=history&limit=2&cursor={response.json()["prev"]}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([booking['id'] for booking in response.json()['results']], [2, 1])
+        self.assertIsNone(response.json()['prev'])
+
+    def test_fail_booking_accomodation_list_due_to_invalid_cursor(self):
+        response = self.f_client.get('/api/bookings?my-stay=history&cursor=invalid')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {
+                'message' : 'Invalid Cursor'
+            }
+        )
+
+    def test_fail_booking_accomodation_list_due_to_cursor_with_invalid_values(self):
+        cursors = [
+            encode_cursor(['start_date', 'id'], ['abc', 1]),
+            encode_cursor(['start_date', 'id'], ['2022-12-01', [1]]),
+            encode_cursor(['start_date', 'id'], ['2022-12-01', None])
+        ]
+
+        for cursor in cursors:
+            response = self.f_client.get(f'/api/bookings?my-stay=history&cursor={cursor}')
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'message' : 'Invalid Cursor'})
+
     def test_success_booking_accomodation_update(self):
         '''
         Update Booked Accomodation Information
@@ -248,13 +309,120 @@ class BookingTest(APITestCase):
             }
         )
 
+    def test_fail_booking_accomodation_update_due_to_invalid_dates(self):
+        cases = [
+            ({'start_date' : '2022-12-28', 'end_date' : '2023-01-02'}, 'Already Booked Accomodation'),
+            ({'start_date' : '2022-10-01', 'end_date' : '2023-02-01'}, 'Already Booked Accomodation'),
+            ({'start_date' : '2022-12-10', 'end_date' : '2022-12-10'}, 'Invalid Date')
+        ]
+
+        for body, message in cases:
+            response = self.f_client.patch('/api/bookings/1', json.dumps(body), content_type='application/json')
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'message' : message})
+
+        self.assertEqual(Booking.objects.values_list('start_date', 'end_date').get(id=1), (date(2022, 12, 1), date(2022, 12, 10)))
+
     def test_success_booking_accomodation_cancel(self):
         '''
         Cancel Booked Accomodation
         '''
         response = self.f_client.delete('/api/bookings?booking-ids=1')
         
-        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'cancelled' : 1})
+        self.assertEqual(Booking.objects.get(id=1).booking_status_id, 4)
+        self.assertEqual(BookingStatus.objects.get(id=4).status, 'CANCELLED')
+
+    def test_success_booking_accomodation_cancel_skips_already_cancelled(self):
+        self.f_client.delete('/api/bookings?booking-ids=1')
+
+        Booking.objects.filter(id=1).update(updated_at=timezone.now() - timedelta(days=1))
+
+        with mock.patch('bookings.views.bump_booking_generations') as bump_booking_generations:
+            response = self.f_client.delete('/api/bookings?booking-ids=1&booking-ids=2')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'cancelled' : 1})
+        self.assertEqual([call.args[0:1] for call in bump_booking_generations.call_args_list], [(Booking.objects.get(id=2).accomodation_id,)])
+        self.assertLess(Booking.objects.get(id=1).updated_at, timezone.now() - timedelta(hours=1))
+
+    def test_success_booking_accomodation_cancel_frees_dates(self):
+        sync_booking_nights(Booking.objects.get(id=1))
+
+        with self.assertNumQueries(6):
+            response = self.f_client.delete('/api/bookings?booking-ids=1&booking-ids=2')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'cancelled' : 2})
+        self.assertFalse(BookingNight.objects.exists())
+
+        booking = {
+            'start_date'         : '2022-12-01',
+            'end_date'           : '2022-12-10',
+            'number_of_adults'   : 1,
+            'number_of_children' : 1,
+            'user_request'       : '다시 예약합니다.',
+            'total_price'        : 10000,
+            'planet_id'          : 1,
+            'accomodation_id'    : 1
+        }
+        response = self.f_client.post('/api/bookings', json.dumps(booking), content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Booking.objects.count(), 4)
+
+    def test_success_expire_pending_bookings(self):
+        BookingStatus.objects.create(id=2, status='PAID')
+
+        for booking in Booking.objects.all():
+            sync_booking_nights(booking)
+
+        Booking.objects.filter(id__in=[1, 2, 3]).update(created_at=timezone.now() - timedelta(hours=1))
+        Booking.objects.filter(id=3).update(booking_status_id=2)
+
+        output = StringIO()
+        call_command('expire_pending_bookings', '--batch-size=1', stdout=output)
+
+        self.assertEqual(dict(Booking.objects.values_list('id', 'booking_status_id')), {1 : 4, 2 : 4, 3 : 2})
+        self.assertEqual(set(BookingNight.objects.values_list('booking_id', flat=True)), {3})
+        self.assertIn('expired    : 2', output.getvalue())
+        self.assertIn('batches    : 2', output.getvalue())
+
+        Booking.objects.filter(id=3).update(booking_status_id=1, created_at=timezone.now())
+
+        call_command('expire_pending_bookings', stdout=output)
+
+        self.assertEqual(Booking.objects.get(id=3).booking_status_id, 1)
+
+    def test_success_expire_pending_bookings_skips_booking_paid_after_select(self):
+        BookingStatus.objects.create(id=2, status='PAID')
+
+        for booking in Booking.objects.all():
+            sync_booking_nights(booking)
+
+        Booking.objects.filter(id=2).update(booking_status_id=2)
+
+        # SELECT 에서는 PENDING 이던 2번 예약이 UPDATE 전에 결제된 경우
+        stays  = list(Booking.objects.filter(id__in=[1, 2]).order_by('id').values_list('id', 'accomodation_id', 'start_date', 'end_date'))
+        select = mock.MagicMock()
+        select.return_value.filter.return_value.order_by.return_value.values_list.return_value.__getitem__.return_value = stays
+
+        with mock.patch.object(Booking.objects, 'select_for_update', select):
+            batches = list(expire_pending_bookings(timezone.now(), 10))
+
+        self.assertEqual(batches, [[stay[1:] for stay in stays[:1]]])
+        self.assertEqual(dict(Booking.objects.filter(id__in=[1, 2]).values_list('id', 'booking_status_id')), {1 : 4, 2 : 2})
+        self.assertEqual(set(BookingNight.objects.values_list('booking_id', flat=True)), {2, 3})
+
+    def test_fail_booking_accomodation_cancel_due_to_already_cancelled(self):
+        self.assertEqual(self.f_client.delete('/api/bookings?booking-ids=1').status_code, 200)
+
+        response = self.f_client.delete('/api/bookings?booking-ids=1')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message':'Invalid Booking Information'})
     
     '''
     아래 테스트 코드는 저장 직전 DB확인을 위한 테스트 코드. serializer와 물려 있기때문에
@@ -327,6 +495,419 @@ class BookingTest(APITestCase):
             }
         )
 
+    def test_success_booking_accomodation_replayed_with_idempotency_key(self):
+        booking = {
+            'start_date'         : '2023-02-01',
+            'end_date'           : '2023-02-03',
+            'number_of_adults'   : 1,
+            'number_of_children' : 1,
+            'user_request'       : '깨끗하게 부탁드려요.',
+            'total_price'        : 10000,
+            'planet_id'          : 1,
+            'accomodation_id'    : 1
+        }
+
+        response = self.f_client.post('/api/bookings', json.dumps(booking), content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        self.assertEqual(response.status_code, 201)
+
+        with CaptureQueriesContext(connection) as context:
+            replayed = self.f_client.post('/api/bookings', json.dumps(booking), content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        self.assertEqual(replayed.status_code, 201)
+        self.assertEqual(replayed.json(), response.json())
+        self.assertEqual(Booking.objects.count(), 4)
+        self.assertFalse([query['sql'] for query in context.captured_queries if '"bookings"' in query['sql'] or 'booking_nights' in query['sql']])
+
+        response = self.f_client.post('/api/bookings', json.dumps(booking), content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-2')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(BookingIdempotencyKey.objects.count(), 1)
+
+    def test_success_booking_accomodation_replayed_when_key_claimed_concurrently(self):
+        '''
+        같은 키의 요청이 앞선 요청이 커밋되기 전에 기록을 조회한 경우. 키 row를 넣다가 IntegrityError가 나면 저장된 응답을 돌려준다.
+        '''
+        booking = {
+            'start_date'         : '2023-02-01',
+            'end_date'           : '2023-02-03',
+            'number_of_adults'   : 1,
+            'number_of_children' : 1,
+            'user_request'       : '깨끗하게 부탁드려요.',
+            'total_price'        : 10000,
+            'planet_id'          : 1,
+            'accomodation_id'    : 1
+        }
+
+        response = self.f_client.post('/api/bookings', json.dumps(booking), content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        with mock.patch('bookings.views.get_idempotency_record', side_effect=[None, BookingIdempotencyKey.objects.get(key='retry-1')]):
+            replayed = self.f_client.post('/api/bookings', json.dumps(booking), content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        self.assertEqual(replayed.status_code, 201)
+        self.assertEqual(replayed.json(), response.json())
+        self.assertEqual(Booking.objects.count(), 4)
+
+    def post_with_claimed_idempotency_key(self, booking, key):
+        '''
+        앞선 요청이 커밋되기 전에 기록을 조회해 None 을 받고, 키 row를 넣다가 IntegrityError 가 난 요청
+        '''
+        lookups = [lambda *args: None, get_idempotency_record]
+
+        with mock.patch('bookings.views.get_idempotency_record', side_effect=lambda *args: lookups.pop(0)(*args)),\
+             mock.patch.object(BookingIdempotencyKey.objects, 'create', side_effect=IntegrityError) as create:
+            response = self.f_client.post('/api/bookings', json.dumps(booking), content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(lookups, [])
+
+        return response
+
+    def test_success_booking_accomodation_replayed_on_idempotency_key_integrity_error(self):
+        booking = {
+            'start_date'         : '2023-02-01',
+            'end_date'           : '2023-02-03',
+            'number_of_adults'   : 1,
+            'number_of_children' : 1,
+            'user_request'       : '깨끗하게 부탁드려요.',
+            'total_price'        : 10000,
+            'planet_id'          : 1,
+            'accomodation_id'    : 1
+        }
+
+        response = self.f_client.post('/api/bookings', json.dumps(booking), content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        replayed = self.post_with_claimed_idempotency_key(booking, 'retry-1')
+
+        self.assertEqual(replayed.status_code, 201)
+        self.assertEqual(replayed.json(), response.json())
+        self.assertEqual(Booking.objects.count(), 4)
+        self.assertEqual(BookingIdempotencyKey.objects.count(), 1)
+
+    def test_fail_booking_accomodation_due_to_reused_idempotency_key_on_integrity_error(self):
+        booking = {
+            'start_date'         : '2023-02-01',
+            'end_date'           : '2023-02-03',
+            'number_of_adults'   : 1,
+            'number_of_children' : 1,
+            'user_request'       : '깨끗하게 부탁드려요.',
+            'total_price'        : 10000,
+            'planet_id'          : 1,
+            'accomodation_id'    : 1
+        }
+
+        self.f_client.post('/api/bookings', json.dumps(booking), content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        response = self.post_with_claimed_idempotency_key(dict(booking, end_date='2023-02-04'), 'retry-1')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'Idempotency Key Reused'})
+        self.assertEqual(Booking.objects.count(), 4)
+
+    def test_fail_booking_accomodation_due_to_reused_idempotency_key(self):
+        booking = {
+            'start_date'         : '2023-02-01',
+            'end_date'           : '2023-02-03',
+            'number_of_adults'   : 1,
+            'number_of_children' : 1,
+            'user_request'       : '깨끗하게 부탁드려요.',
+            'total_price'        : 10000,
+            'planet_id'          : 1,
+            'accomodation_id'    : 1
+        }
+
+        self.f_client.post('/api/bookings', json.dumps(booking), content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        cases = [
+            ('retry-1', dict(booking, end_date='2023-02-04'), 'Idempotency Key Reused'),
+            ('', booking, 'Invalid Idempotency Key'),
+            ('k' * 65, booking, 'Invalid Idempotency Key')
+        ]
+
+        for key, body, message in cases:
+            response = self.f_client.post('/api/bookings', json.dumps(body), content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'message' : message})
+
+        self.assertEqual(Booking.objects.count(), 4)
+
+    def get_bulk_bookings(self):
+        Accomodation.objects.create(
+            id            = 2,
+            name          = '큰숙소',
+            price         = 20000,
+            min_of_people = 2,
+            max_of_people = 6,
+            num_of_bed    = 3,
+            description   = "커요.",
+            planet_id     = 1
+        )
+
+        return [
+            {
+                'start_date'         : '2023-03-01',
+                'end_date'           : '2023-03-03',
+                'number_of_adults'   : 3,
+                'number_of_children' : 0,
+                'user_request'       : '',
+                'total_price'        : 20000,
+                'planet_id'          : 1,
+                'accomodation_id'    : 1
+            },
+            {
+                'start_date'         : '2023-03-01',
+                'end_date'           : '2023-03-04',
+                'number_of_adults'   : 2,
+                'number_of_children' : 2,
+                'user_request'       : '같이 가요.',
+                'total_price'        : 60000,
+                'planet_id'          : 1,
+                'accomodation_id'    : 2
+            }
+        ]
+
+    def test_success_bulk_booking_accomodations(self):
+        bookings = self.get_bulk_bookings()
+        response = self.f_client.post('/api/bookings/bulk', json.dumps({'bookings' : bookings}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([(booking['accomodation_id'], booking['start_date'], booking['end_date'], booking['price']) for booking in response.json()], [
+            (1, '2023-03-01', '2023-03-03', '21000.00'),
+            (2, '2023-03-01', '2023-03-04', '64000.00')
+        ])
+        self.assertEqual(BookingNight.objects.filter(booking_id__in=[booking['id'] for booking in response.json()]).count(), 5)
+
+    def test_fail_bulk_booking_accomodations_rolls_back_all(self):
+        bookings = self.get_bulk_bookings()
+        cases    = [
+            ([bookings[1], dict(bookings[0], start_date='2023-01-19')], 'Already Booked Accomodation'),
+            ([bookings[0], dict(bookings[1], accomodation_id=1)], 'Already Booked Accomodation'),
+            ([bookings[0], dict(bookings[1], number_of_adults=7)], 'Invalid Num Of People'),
+            ([bookings[0], dict(bookings[1], accomodation_id=3)], 'Invalid Accomodation'),
+            ([bookings[0], dict(bookings[1], planet_id=2)], 'Invalid Accomodation'),
+            ([bookings[0], dict(bookings[1], end_date='2023-03-01')], 'Invalid Date'),
+            ([bookings[0]] * (MAX_BULK_BOOKING_SIZE + 1), 'Too Many Bookings'),
+            ([], 'Invalid Request')
+        ]
+
+        for body, message in cases:
+            response = self.f_client.post('/api/bookings/bulk', json.dumps({'bookings' : body}), content_type='application/json')
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'message' : message})
+
+        self.assertEqual(Booking.objects.count(), 3)
+        self.assertFalse(BookingNight.objects.exists())
+
+    def tearDown(self):
+        caches[HOLD_CACHE_ALIAS].clear()
+
+    def get_other_client(self):
+        User.objects.create(id=2, name='otherman', email='other@test.com', kakao_id=1234567892222)
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=jwt.encode({'id' : 2, 'exp' : datetime.utcnow() + timedelta(days=2)}, SECRET_KEY, ALGORITHM))
+
+        return client
+
+    def get_hold_day(self, days):
+        return date.today() + timedelta(days=30+days)
+
+    def test_success_booking_hold_blocks_other_users(self):
+        other_client = self.get_other_client()
+        day          = lambda days : self.get_hold_day(days).isoformat()
+        hold         = {'accomodation_id' : 1, 'start_date' : day(0), 'end_date' : day(2)}
+        booking      = {
+            'start_date'         : day(1),
+            'end_date'           : day(4),
+            'number_of_adults'   : 1,
+            'number_of_children' : 1,
+            'user_request'       : '깨끗하게 부탁드려요.',
+            'total_price'        : 10000,
+            'planet_id'          : 1,
+            'accomodation_id'    : 1
+        }
+
+        response = self.f_client.post('/api/bookings/holds', json.dumps(hold), content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual({key : value for key, value in response.json().items() if key not in ('hold_token', 'expires_at')}, hold)
+
+        for url, body in [('/api/bookings', booking), ('/api/bookings/holds', dict(hold, start_date=day(-4))), ('/api/bookings/bulk', {'bookings' : [booking]})]:
+            response = other_client.post(url, json.dumps(body), content_type='application/json')
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'message' : 'Already Held Accomodation'})
+
+        self.assertEqual(Booking.objects.count(), 3)
+
+        response = self.f_client.post('/api/bookings', json.dumps(booking), content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(HoldStore().get_held_nights([(1, self.get_hold_day(0), self.get_hold_day(4))]), {1 : [self.get_hold_day(0)]})
+
+    def test_success_booking_hold_release(self):
+        other_client = self.get_other_client()
+        hold         = {'accomodation_id' : 1, 'start_date' : self.get_hold_day(0).isoformat(), 'end_date' : self.get_hold_day(2).isoformat()}
+        hold_token   = self.f_client.post('/api/bookings/holds', json.dumps(hold), content_type='application/json').json()['hold_token']
+
+        response = other_client.delete(f'/api/bookings/holds/{hold_token}')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'Invalid Hold'})
+
+        response = self.f_client.delete(f'/api/bookings/holds/{hold_token}')
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(other_client.post('/api/bookings/holds', json.dumps(hold), content_type='application/json').status_code, 201)
+        self.assertEqual(self.f_client.delete(f'/api/bookings/holds/{hold_token}').status_code, 400)
+
+    def test_fail_booking_hold(self):
+        day  = lambda days : self.get_hold_day(days).isoformat()
+        hold = {'accomodation_id' : 1, 'start_date' : day(0), 'end_date' : day(2)}
+
+        Booking.objects.create(booking_number=uuid4(), start_date=day(40), end_date=day(42), number_of_adults=2, number_of_children=0,
+                               user_request='', price=20000, user_id=1, booking_status_id=1, planet_id=1, accomodation_id=1)
+
+        cases = [
+            (dict(hold, start_date=day(41), end_date=day(43)), 'Already Booked Accomodation'),
+            (dict(hold, accomodation_id=3), 'Invalid Accomodation'),
+            (dict(hold, end_date=day(0)), 'Invalid Date'),
+            (dict(hold, end_date=day(MAX_HOLD_NIGHTS+1)), 'Invalid Date'),
+            (dict(hold, start_date=(date.today() - timedelta(days=1)).isoformat(), end_date=date.today().isoformat()), 'Invalid Date'),
+            (dict(hold, start_date=(date.today() + HOLD_HORIZON).isoformat(), end_date=(date.today() + HOLD_HORIZON + timedelta(days=1)).isoformat()), 'Invalid Date'),
+            (dict(hold, start_date='2023-3'), 'Invalid Request'),
+            ({'accomodation_id' : 1}, 'Invalid Request')
+        ]
+
+        for body, message in cases:
+            response = self.f_client.post('/api/bookings/holds', json.dumps(body), content_type='application/json')
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'message' : message})
+
+    def test_booking_update_respects_holds(self):
+        other_client = self.get_other_client()
+        day          = lambda days : self.get_hold_day(days).isoformat()
+
+        other_client.post('/api/bookings/holds', json.dumps({'accomodation_id' : 1, 'start_date' : day(0), 'end_date' : day(2)}), content_type='application/json')
+        self.f_client.post('/api/bookings/holds', json.dumps({'accomodation_id' : 1, 'start_date' : day(10), 'end_date' : day(12)}), content_type='application/json')
+
+        response = self.f_client.patch('/api/bookings/1', json.dumps({'start_date' : day(1), 'end_date' : day(3)}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'Already Held Accomodation'})
+        self.assertEqual(Booking.objects.values_list('start_date', 'end_date').get(id=1), (date(2022, 12, 1), date(2022, 12, 10)))
+
+        response = self.f_client.patch('/api/bookings/1', json.dumps({'start_date' : day(10), 'end_date' : day(12)}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Booking.objects.values_list('start_date', 'end_date').get(id=1), (self.get_hold_day(10), self.get_hold_day(12)))
+        self.assertFalse(HoldStore().is_held([(1, self.get_hold_day(10), self.get_hold_day(12))]))
+
+    def test_hold_store_acquire_is_all_or_nothing(self):
+        store = HoldStore()
+        day   = self.get_hold_day
+
+        store.acquire(2, 1, day(2), day(3))
+
+        with self.assertRaisesMessage(ValidationError, 'Already Held Accomodation'):
+            store.acquire(1, 1, day(0), day(4))
+
+        self.assertEqual(store.get_held_nights([(1, day(0), day(4))]), {1 : [day(2)]})
+        self.assertEqual(store.get_held_nights([(1, day(0), day(4))], user_id=2), {1 : []})
+
+        with mock.patch('bookings.holds.HOLD_TTL', timedelta(0)):
+            hold_token, _ = store.acquire(1, 1, day(9), day(11))
+
+        self.assertIsNone(store.get(hold_token))
+        self.assertFalse(store.is_held([(1, day(9), day(11))]))
+
+    def test_hold_store_acquire_does_not_overwrite_night_taken_after_expiry(self):
+        store = HoldStore()
+        day   = self.get_hold_day
+        key   = get_hold_night_key(1, day(2))
+        other = {'hold_token' : 'other', 'user_id' : 3, 'expires_at' : timezone.now() + HOLD_TTL}
+
+        store.acquire(2, 1, day(2), day(3))
+
+        def expire_and_take(cache, key, *args, **kwargs):
+            cache.delete(key)
+            cache.add(key, other, HOLD_TTL.total_seconds())
+            return None
+
+        with mock.patch.object(LocMemCache, 'get', autospec=True, side_effect=expire_and_take):
+            with self.assertRaisesMessage(ValidationError, 'Already Held Accomodation'):
+                store.acquire(1, 1, day(0), day(4))
+
+        self.assertEqual(store.cache.get(key), other)
+        self.assertEqual(store.get_held_nights([(1, day(0), day(4))]), {1 : [day(2)]})
+
+    def test_hold_store_acquire_rollback_restores_taken_over_nights(self):
+        store = HoldStore()
+        day   = self.get_hold_day
+
+        hold_token, _ = store.acquire(1, 1, day(0), day(3))
+        store.acquire(2, 1, day(5), day(6))
+
+        with self.assertRaisesMessage(ValidationError, 'Already Held Accomodation'):
+            store.acquire(1, 1, day(1), day(6))
+
+        held = {night : value['hold_token'] for night, value in store.cache.get_many([get_hold_night_key(1, day(days)) for days in range(5)]).items()}
+
+        self.assertEqual(held, {get_hold_night_key(1, day(days)) : hold_token for days in range(3)})
+
+        store.release(1, hold_token)
+
+        self.assertEqual(store.get_held_nights([(1, day(0), day(6))]), {1 : [day(5)]})
+
+    def test_hold_store_lookup_is_bounded_by_hold_horizon(self):
+        store = HoldStore()
+
+        store.acquire(2, 1, self.get_hold_day(2), self.get_hold_day(3))
+
+        with mock.patch.object(LocMemCache, 'get_many', autospec=True, side_effect=LocMemCache.get_many) as get_many:
+            held_nights = store.get_held_nights([(1, date(1000, 1, 1), date(9999, 1, 1)), (1, date(1000, 1, 1), date(9999, 1, 1))])
+
+        self.assertEqual(held_nights, {1 : [self.get_hold_day(2)]})
+        self.assertEqual(len(get_many.call_args[0][1]), HOLD_HORIZON.days)
+
+    def test_fail_booking_accomodation_due_to_booking_inside_other_booking(self):
+        booking = {
+            'start_date'         : '2023-01-05',
+            'end_date'           : '2023-01-08',
+            'number_of_adults'   : 1,
+            'number_of_children' : 1,
+            'user_request'       : '테스트',
+            'total_price'        : 10000,
+            'planet_id'          : 1,
+            'accomodation_id'    : 1
+        }
+        response = self.f_client.post('/api/bookings', json.dumps(booking), content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message':'Already Booked Accomodation'})
+        self.assertEqual(Booking.objects.count(), 3)
+
+    def test_fail_booking_other_accomodation_inside_own_booking(self):
+        self.get_bulk_bookings()
+
+        booking = {
+            'start_date'         : '2022-12-03',
+            'end_date'           : '2022-12-05',
+            'number_of_adults'   : 2,
+            'number_of_children' : 0,
+            'user_request'       : '테스트',
+            'total_price'        : 40000,
+            'planet_id'          : 1,
+            'accomodation_id'    : 2
+        }
+        response = self.f_client.post('/api/bookings', json.dumps(booking), content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message':'Already Booked Accomodation'})
+        self.assertEqual(Booking.objects.count(), 3)
+
     def test_fail_booking_accomodation_due_to_invalid_accomodation(self):
         booking = {
             'start_date'         : '2023-03-22',
@@ -407,4 +988,113 @@ class BookingTest(APITestCase):
             {
                 'message':'Invalid Booking Information'
             }
-        )
\ No newline at end of file
+        )
+
+@skipUnlessDBFeature('has_select_for_update')
+class BookingConcurrencyTest(TransactionTestCase):
+    '''
+    여러 스레드가 동시에 예약할 때 같은 숙소의 예약 기간이 겹치지 않는지 확인 (row lock이 되는 DB에서만)
+    '''
+    THREADS = 8
+
+    def setUp(self):
+        self.user = User.objects.create(name='testman', email='test@test.com', kakao_id=1234567891111)
+
+        Galaxy.objects.create(id=1, name='우리은하')
+        PlanetTheme.objects.create(id=1, name='불')
+        Planet.objects.create(id=1, name='멋진행성', thumbnail='https://wonderful.img/test1.jpg', theme_id=1, galaxy_id=1)
+        BookingStatus.objects.create(id=1, status='PENDING')
+
+        Accomodation.objects.bulk_create([
+            Accomodation(id=accomodation_id, name='멋진숙소', price=10000, min_of_people=2, max_of_people=4, num_of_bed=2, description='멋져요.', planet_id=1)
+            for accomodation_id in (1, 2)
+        ])
+
+    def book(self, barrier, results, accomodation_id, start_date, end_date):
+        serializer = BookingSerializer(data={
+            'booking_number'     : str(uuid4()),
+            'start_date'         : start_date,
+            'end_date'           : end_date,
+            'number_of_adults'   : 2,
+            'number_of_children' : 0,
+            'user_request'       : '테스트',
+            'price'              : 10000,
+            'user_id'            : self.user.id,
+            'booking_status_id'  : 1,
+            'planet_id'          : 1,
+            'accomodation_id'    : accomodation_id
+        })
+
+        try:
+            serializer.is_valid(raise_exception=True)
+            barrier.wait()
+            serializer.save()
+            results.append((accomodation_id, 'booked'))
+
+        except ValidationError:
+            results.append((accomodation_id, 'conflict'))
+
+        finally:
+            connection.close()
+
+    def test_concurrent_retries_with_same_idempotency_key_replay_first_response(self):
+        token   = jwt.encode({'id' : self.user.id, 'exp' : datetime.utcnow() + timedelta(days=2)}, SECRET_KEY, ALGORITHM)
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+        booking = {
+            'start_date'         : '2030-01-01',
+            'end_date'           : '2030-01-03',
+            'number_of_adults'   : 2,
+            'number_of_children' : 0,
+            'user_request'       : '테스트',
+            'total_price'        : 10000,
+            'planet_id'          : 1,
+            'accomodation_id'    : 1
+        }
+
+        def post():
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=token)
+
+            try:
+                barrier.wait()
+                response = client.post('/api/bookings', json.dumps(booking), content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-1')
+                results.append((response.status_code, response.json()))
+
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post) for _ in range(self.THREADS)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual([status_code for status_code, _ in results], [201] * self.THREADS)
+        self.assertEqual(len({body['booking_number'] for _, body in results}), 1)
+
+    def test_concurrent_bookings_do_not_overlap(self):
+        start   = date(2030, 1, 1)
+        barrier = threading.Barrier(self.THREADS * 2)
+        results = []
+        threads = []
+
+        for index in range(self.THREADS):
+            threads.append(threading.Thread(target=self.book, args=(barrier, results, 1, start + timedelta(days=index % 2), start + timedelta(days=index % 2 + 3))))
+            threads.append(threading.Thread(target=self.book, args=(barrier, results, 2, start + timedelta(days=index * 3), start + timedelta(days=index * 3 + 3))))
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        bookings = list(Booking.objects.filter(accomodation_id=1).values_list('start_date', 'end_date'))
+
+        self.assertEqual(len(results), self.THREADS * 2)
+        self.assertEqual(len(bookings), 1)
+        self.assertEqual(results.count((1, 'booked')), 1)
+        self.assertEqual(results.count((2, 'booked')), self.THREADS)
@@ -1,8 +1,11 @@
 from django.urls import path
 
-from bookings.views import BookingView, BookingDetailView
+from bookings.views import BookingView, BookingDetailView, BookingBulkView, BookingHoldView, BookingHoldDetailView
 
 urlpatterns = [
     path('', BookingView.as_view()),
+    path('/bulk', BookingBulkView.as_view()),
+    path('/holds', BookingHoldView.as_view()),
+    path('/holds/<str:hold_token>', BookingHoldDetailView.as_view()),
     path('/<int:booking_id>', BookingDetailView.as_view()),
 ]
\ No newline at end of file
@@ -1,14 +1,30 @@
+import json
+import uuid
+import hashlib
 from decimal import Decimal
+from datetime import datetime, timedelta
 
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 
 from planets.models import Accomodation
 
-def check_validation_request(request_data):
-    SURCHARGE_RATE = 0.1
+from .holds import hold_store
+from .models import Booking, BookingNight, BookingIdempotencyKey, BookingStatusEnum
+
+SURCHARGE_RATE = 0.1
 
+def check_validation_request(request_data):
     accomodation = Accomodation.objects.get(id=request_data['accomodation_id'])
-    
+
+    return check_booking_request(request_data, accomodation)
+
+def check_booking_request(request_data, accomodation):
+    '''
+    인원을 확인하고 min_of_people 보다 많은 인원만큼 추가 요금을 total_price 에 더한다.
+    '''
     number_of_adults   = request_data.get('number_of_adults', 1)
     number_of_children = request_data.get('number_of_children', 0)
     num_of_people      = number_of_adults+number_of_children
@@ -26,4 +42,190 @@ def check_validation_request(request_data):
     request_data['number_of_children'] = number_of_children
     request_data['total_price'] = total_price
 
-    return request_data
\ No newline at end of file
+    return request_data
+
+def sync_booking_nights(booking, created=False):
+    '''
+    created : 방금 만든 예약이면 지울 밤이 없으므로 DELETE를 건너뛴다.
+    취소된 예약은 밤을 만들지 않는다.
+    '''
+    if not created:
+        BookingNight.objects.filter(booking=booking).delete()
+
+    if booking.booking_status_id == BookingStatusEnum.CANCELLED.value:
+        return
+
+    stays = (booking.end_date - booking.start_date).days
+
+    BookingNight.objects.bulk_create([
+        BookingNight(
+            date            = booking.start_date+timedelta(days=stay),
+            booking_id      = booking.id,
+            accomodation_id = booking.accomodation_id
+        ) for stay in range(stays)
+    ])
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+IDEMPOTENCY_KEY_TTL        = timedelta(days=1)
+
+def get_request_hash(request_data):
+    return hashlib.md5(json.dumps(request_data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def get_idempotency_record(user, key, request_hash):
+    '''
+    저장된 응답(BookingIdempotencyKey) 또는 None. IDEMPOTENCY_KEY_TTL 이 지난 기록은 지우고 None
+    같은 키로 다른 요청을 보내면 ValidationError
+    '''
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise ValidationError('Invalid Idempotency Key')
+
+    record = BookingIdempotencyKey.objects.filter(user=user, key=key).first()
+
+    if record is None:
+        return None
+
+    if record.created_at < timezone.now() - IDEMPOTENCY_KEY_TTL:
+        record.delete()
+        return None
+
+    if record.request_hash != request_hash:
+        raise ValidationError('Idempotency Key Reused')
+
+    return record
+
+MAX_BULK_BOOKING_SIZE = 10
+
+def create_bulk_bookings(user, booking_requests, booking_status_id):
+    '''
+    booking_requests : BookingView.post 요청과 같은 모양의 dict 리스트, 최대 MAX_BULK_BOOKING_SIZE 개
+    다른 사용자가 결제 중(hold)인 밤이 있으면 트랜잭션을 열기 전에 ValidationError
+    숙소 row를 id 순으로 한 번에 잠그고, 겹침 확인과 저장을 묶음 쿼리로 한 트랜잭션 안에서 처리한다. 하나라도 실패하면 모두 롤백
+    요청 순서대로 Booking 리스트를 돌려준다.
+    '''
+    if not isinstance(booking_requests, list) or not booking_requests:
+        raise ValidationError('Invalid Request')
+
+    if len(booking_requests) > MAX_BULK_BOOKING_SIZE:
+        raise ValidationError('Too Many Bookings')
+
+    stays = []
+
+    for request_data in booking_requests:
+        try:
+            accomodation_id = int(request_data['accomodation_id'])
+            start_date      = datetime.strptime(request_data['start_date'], '%Y-%m-%d').date()
+            end_date        = datetime.strptime(request_data['end_date'], '%Y-%m-%d').date()
+
+        except (TypeError, ValueError):
+            raise ValidationError('Invalid Request')
+
+        if start_date >= end_date:
+            raise ValidationError('Invalid Date')
+
+        stays.append((accomodation_id, start_date, end_date))
+
+    for index, (accomodation_id, start_date, end_date) in enumerate(stays):
+        for other_id, other_start, other_end in stays[index+1:]:
+            if other_id == accomodation_id and other_start < end_date and other_end > start_date:
+                raise ValidationError('Already Booked Accomodation')
+
+    if hold_store.is_held(stays, user.id):
+        raise ValidationError('Already Held Accomodation')
+
+    with transaction.atomic():
+        accomodations = {accomodation.id : accomodation for accomodation in
+                         Accomodation.objects.select_for_update().filter(id__in={stay[0] for stay in stays}).order_by('id')}
+
+        for request_data, (accomodation_id, _, _) in zip(booking_requests, stays):
+            accomodation = accomodations.get(accomodation_id)
+
+            if accomodation is None or str(accomodation.planet_id) != str(request_data['planet_id']):
+                raise Accomodation.DoesNotExist
+
+        q = Q()
+
+        for accomodation_id, start_date, end_date in stays:
+            q |= Q(accomodation_id=accomodation_id, start_date__lt=end_date, end_date__gt=start_date)
+
+        if Booking.objects.active().filter(q).exists():
+            raise ValidationError('Already Booked Accomodation')
+
+        bookings = []
+
+        for request_data, (accomodation_id, start_date, end_date) in zip(booking_requests, stays):
+            request_data = check_booking_request(dict(request_data), accomodations[accomodation_id])
+
+            bookings.append(Booking(
+                booking_number     = uuid.uuid4(),
+                start_date         = start_date,
+                end_date           = end_date,
+                number_of_adults   = request_data['number_of_adults'],
+                number_of_children = request_data['number_of_children'],
+                user_request       = request_data.get('user_request') or '',
+                price              = request_data['total_price'],
+                user               = user,
+                booking_status_id  = booking_status_id,
+                planet_id          = accomodations[accomodation_id].planet_id,
+                accomodation_id    = accomodation_id
+            ))
+
+        Booking.objects.bulk_create(bookings)
+
+        # MySQL 은 bulk_create 후 pk를 채워주지 않으므로 다시 읽는다. booking_number 는 인덱스가 없어서 (숙소, 기간) 인덱스로 찾는다.
+        q = Q()
+
+        for booking in bookings:
+            q |= Q(accomodation_id=booking.accomodation_id, start_date=booking.start_date, end_date=booking.end_date, booking_number=booking.booking_number)
+
+        created  = {booking.booking_number : booking for booking in Booking.objects.filter(q)}
+        bookings = [created[booking.booking_number] for booking in bookings]
+
+        BookingNight.objects.bulk_create([
+            BookingNight(
+                date            = booking.start_date+timedelta(days=stay),
+                booking_id      = booking.id,
+                accomodation_id = booking.accomodation_id
+            ) for booking in bookings for stay in range((booking.end_date - booking.start_date).days)
+        ])
+
+    return bookings
+
+PENDING_BOOKING_TTL = timedelta(minutes=30)
+
+def expire_pending_bookings(expired_before, batch_size):
+    '''
+    expired_before 보다 먼저 만들어진 PENDING 예약을 batch_size 개씩 CANCELLED 로 바꾸고 밤을 지운다. 한 배치가 한 트랜잭션
+    다른 트랜잭션이 잡고 있는 예약은 건너뛰고(skip_locked), UPDATE 에서도 PENDING 인지 다시 확인해 그 사이 결제된 예약은 건드리지 않는다.
+    배치마다 만료된 (accomodation_id, start_date, end_date) 리스트를 돌려주는 제너레이터
+    '''
+    pending = BookingStatusEnum.PENDING.value
+
+    while True:
+        with transaction.atomic():
+            stays = list(Booking.objects.select_for_update(skip_locked=True)
+                                        .filter(booking_status_id=pending, created_at__lt=expired_before)
+                                        .order_by('created_at', 'id')
+                                        .values_list('id', 'accomodation_id', 'start_date', 'end_date')[:batch_size])
+
+            if not stays:
+                return
+
+            booking_ids = [stay[0] for stay in stays]
+            selected    = len(stays)
+            expired_at  = timezone.now()
+
+            expired = Booking.objects.filter(id__in=booking_ids, booking_status_id=pending)\
+                                     .update(booking_status_id=BookingStatusEnum.CANCELLED.value, updated_at=expired_at)
+
+            # 고른 뒤 UPDATE 전에 상태가 바뀐 예약이 있으면, 이 UPDATE 로 바뀐 예약(updated_at=expired_at)의 밤만 지운다.
+            if expired < selected:
+                booking_ids = set(Booking.objects.filter(id__in=booking_ids, booking_status_id=BookingStatusEnum.CANCELLED.value, updated_at=expired_at)
+                                                 .values_list('id', flat=True))
+                stays       = [stay for stay in stays if stay[0] in booking_ids]
+
+            BookingNight.objects.filter(booking_id__in=booking_ids).delete()
+
+        yield [stay[1:] for stay in stays]
+
+        if selected < batch_size:
+            return
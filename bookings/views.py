@@ -1,8 +1,9 @@
 import uuid
-from enum import Enum
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from django.http import JsonResponse
+from django.utils import timezone
+from django.db import transaction, IntegrityError
 from django.db.models import Q
 from django.core.exceptions import ValidationError
 
@@ -12,22 +13,19 @@ from rest_framework.response import Response
 
 from drf_yasg.utils import swagger_auto_schema
 
+from core.utils import paginate_by_cursor
 from users.utils import login_decorator
+from planets.utils import bump_booking_generations, bump_generations, get_accomodation_generation_key
 from planets.models import Accomodation
-from bookings.models import Booking
+from bookings.models import Booking, BookingNight, BookingIdempotencyKey, BookingStatusEnum
 
-from .utils import check_validation_request
+from .holds import hold_store
+from .utils import check_validation_request, create_bulk_bookings, get_request_hash, get_idempotency_record
 from .swagger import BookingSwaager
-from .serializers import BookingSerializer, BookingPostSchemaSerializer, BookingUpdateSchemaSerializer
-
-class BookingStatusEnum(Enum):
-    PENDING   = 1
-    PAID      = 2
-    RESERVED  = 3
-    CANCELLED = 4
+from .serializers import BookingSerializer, BookingCancelSchemaSerializer, BookingPostSchemaSerializer, BookingBulkPostSchemaSerializer, BookingHoldPostSchemaSerializer, BookingHoldSchemaSerializer, BookingUpdateSchemaSerializer
 
 class BookingView(APIView):
-    @swagger_auto_schema(manual_parameters=[BookingSwaager.my_stay, BookingSwaager.limit, BookingSwaager.offset],
+    @swagger_auto_schema(manual_parameters=[BookingSwaager.my_stay, BookingSwaager.limit, BookingSwaager.offset, BookingSwaager.cursor],
                          responses={200 : BookingSerializer, 400 : "Invalid Reason Message"}, tags=["Booking"]
     )
     @login_decorator
@@ -40,6 +38,7 @@ class BookingView(APIView):
 
             limit  = int(request.GET.get('limit', 3))
             offset = int(request.GET.get('offset', 0))
+            cursor = request.GET.get('cursor')
             today  = datetime.today().strftime("%Y-%m-%d")
             user   = request.user
 
@@ -52,11 +51,18 @@ class BookingView(APIView):
 
             q &= filtering_set[my_stay]
 
-            bookings = Booking.objects.filter(q)[offset:offset+limit]
+            if cursor is None:
+                bookings = Booking.objects.filter(q).order_by('id')[offset:offset+limit]
+
+                serializer = BookingSerializer(bookings, many=True)
+
+                return Response(data=serializer.data, status=status.HTTP_200_OK)
+
+            bookings, next_cursor, prev_cursor = paginate_by_cursor(Booking.objects.filter(q), ['start_date', 'id'], cursor, limit)
 
             serializer = BookingSerializer(bookings, many=True)
 
-            return Response(data=serializer.data, status=status.HTTP_200_OK)
+            return Response(data={'results' : serializer.data, 'next' : next_cursor, 'prev' : prev_cursor}, status=status.HTTP_200_OK)
         
         except ValidationError as e:
             return JsonResponse({'message' : e.message}, status=status.HTTP_400_BAD_REQUEST)
@@ -64,47 +70,60 @@ class BookingView(APIView):
     @swagger_auto_schema(request_body=BookingPostSchemaSerializer, responses={201 : BookingSerializer, 400 : "Invalid Reason Message"}, tags=["Booking"])
     @login_decorator
     def post(self, request):
+        '''
+        Idempotency-Key 헤더가 있으면 처음 201 응답을 저장해 두고, 같은 키로 다시 오면 그 응답을 그대로 돌려준다.
+        키 row를 예약보다 먼저 넣어서, 같은 키로 동시에 온 요청은 unique 인덱스에서 먼저 온 요청이 끝나기를 기다렸다가 그 응답을 돌려준다.
+        다른 사용자가 결제 중(hold)인 밤이면 예약 트랜잭션 전에 400, 예약이 끝나면 내 hold 는 푼다.
+        '''
         try:
             data = request.data
             user = request.user
-            
-            start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
-            end_date   = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
-            
-            data = check_validation_request(request_data=data)
 
-            q = Q()
-
-            q &= Q(user_id=user.id)
-            q &= Q(start_date__range=(start_date, end_date-timedelta(days=1)))\
-                 | Q(end_date__range=(start_date+timedelta(days=1), end_date))
-
-            if Booking.objects.filter(q):
-                return JsonResponse({'message':'Already Booked Accomodation'}, status=status.HTTP_400_BAD_REQUEST)
-
-            save_data = {
-                'booking_number' : str(uuid.uuid4()),
-                'start_date' : start_date,
-                'end_date' : end_date,
-                'number_of_adults' : data["number_of_adults"],
-                'number_of_children' : data["number_of_children"],
-                'user_request' : data.get('user_request', None),
-                'price' : data['total_price'],
-                'user_id' : user.id,
-                'booking_status_id' : BookingStatusEnum.PENDING.value,
-                'planet_id' : data['planet_id'],
-                'accomodation_id' : data['accomodation_id']
-            }
-            
-            serializer = BookingSerializer(data=save_data)
-            
-            if serializer.is_valid():
-                serializer.save()
+            idempotency_key = request.headers.get('Idempotency-Key')
+
+            if idempotency_key is None:
+                booking, stays = self.create_booking(data, user)
 
-                return Response(data=serializer.data, status=status.HTTP_201_CREATED)
-            
             else:
-                raise ValidationError(serializer.errors)
+                request_hash = get_request_hash(data)
+                record       = get_idempotency_record(user, idempotency_key, request_hash)
+
+                if record:
+                    return Response(data=record.response, status=record.status_code)
+
+                with transaction.atomic():
+                    record = BookingIdempotencyKey.objects.create(
+                        key          = idempotency_key,
+                        request_hash = request_hash,
+                        status_code  = status.HTTP_201_CREATED,
+                        response     = {},
+                        user         = user
+                    )
+
+                    booking, stays = self.create_booking(data, user)
+
+                    record.response = booking
+                    record.save(update_fields=['response', 'updated_at'])
+
+            hold_store.release_stays(user.id, stays)
+
+            return Response(data=booking, status=status.HTTP_201_CREATED)
+
+        except IntegrityError:
+            # 같은 키의 요청이 먼저 저장된 경우. 이 요청은 아무것도 저장하지 않고 롤백되었다.
+            if idempotency_key is None:
+                raise
+
+            try:
+                record = get_idempotency_record(request.user, idempotency_key, request_hash)
+
+            except ValidationError as e:
+                return JsonResponse({'message': e.message}, status=status.HTTP_400_BAD_REQUEST)
+
+            if record is None:
+                raise
+
+            return Response(data=record.response, status=record.status_code)
         
         except Accomodation.DoesNotExist:
             return JsonResponse({'message' : 'Invalid Accomodation'}, status=status.HTTP_400_BAD_REQUEST)
@@ -115,20 +134,162 @@ class BookingView(APIView):
         except KeyError:
             return JsonResponse({'message':'Invalid Request'}, status=status.HTTP_400_BAD_REQUEST)
 
-    @swagger_auto_schema(manual_parameters=[BookingSwaager.booking_id], responses={204 : "No Content", 400 : 'Invalid Booking Information'}, tags=["Booking"])
+    def create_booking(self, data, user):
+        '''
+        예약을 저장하고 (응답 데이터, 예약한 stays) 를 돌려준다. 저장하지 못하면 ValidationError
+        '''
+        start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+        end_date   = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
+        stays      = [(data['accomodation_id'], start_date, end_date)]
+
+        if hold_store.is_held(stays, user.id):
+            raise ValidationError('Already Held Accomodation')
+        
+        data = check_validation_request(request_data=data)
+
+        if Booking.objects.active().filter(user_id=user.id, start_date__lt=end_date, end_date__gt=start_date).exists():
+            raise ValidationError('Already Booked Accomodation')
+
+        save_data = {
+            'booking_number' : str(uuid.uuid4()),
+            'start_date' : start_date,
+            'end_date' : end_date,
+            'number_of_adults' : data["number_of_adults"],
+            'number_of_children' : data["number_of_children"],
+            'user_request' : data.get('user_request', None),
+            'price' : data['total_price'],
+            'user_id' : user.id,
+            'booking_status_id' : BookingStatusEnum.PENDING.value,
+            'planet_id' : data['planet_id'],
+            'accomodation_id' : data['accomodation_id']
+        }
+        
+        serializer = BookingSerializer(data=save_data)
+        
+        if not serializer.is_valid():
+            raise ValidationError(serializer.errors)
+
+        serializer.save()
+
+        return serializer.data, stays
+
+    @swagger_auto_schema(manual_parameters=[BookingSwaager.booking_id], responses={200 : BookingCancelSchemaSerializer, 400 : 'Invalid Booking Information'}, tags=["Booking"])
     @login_decorator
     def delete(self, request):
+        '''
+        예약을 지우지 않고 UPDATE 한 번으로 CANCELLED 상태로 바꾸고, 바꾼 예약 수를 cancelled 로 돌려준다.
+        취소할 예약을 먼저 잠가서 읽고, 그 예약의 밤만 지워 예약 가능 여부에서 빠지게 한다. (이미 취소된 예약은 건드리지 않는다.)
+        '''
         user        = request.user
         booking_ids = request.GET.getlist('booking-ids')
-        bookings    = Booking.objects.filter(user=user, id__in=booking_ids)
-            
-        if not bookings:
-            return JsonResponse({'message':'Invalid Booking Information'}, status=status.HTTP_400_BAD_REQUEST)
 
-        bookings.delete()
+        with transaction.atomic():
+            bookings = list(Booking.objects.active()\
+                                           .select_for_update()\
+                                           .filter(user=user, id__in=booking_ids)\
+                                           .values_list('id', 'accomodation_id', 'start_date', 'end_date'))
 
-        return Response(status=status.HTTP_204_NO_CONTENT)
+            if not bookings:
+                return JsonResponse({'message':'Invalid Booking Information'}, status=status.HTTP_400_BAD_REQUEST)
+
+            cancelled_ids = [booking_id for booking_id, _, _, _ in bookings]
+
+            cancelled = Booking.objects.active()\
+                                       .filter(id__in=cancelled_ids)\
+                                       .update(booking_status_id=BookingStatusEnum.CANCELLED.value, updated_at=timezone.now())
+
+            BookingNight.objects.filter(booking_id__in=cancelled_ids).delete()
+
+        for _, accomodation_id, start_date, end_date in bookings:
+            bump_booking_generations(accomodation_id, start_date, end_date)
+
+        return Response(data={'cancelled' : cancelled}, status=status.HTTP_200_OK)
         
+class BookingBulkView(APIView):
+    @swagger_auto_schema(request_body=BookingBulkPostSchemaSerializer, responses={201 : BookingSerializer(many=True), 400 : "Invalid Reason Message"}, tags=["Booking"])
+    @login_decorator
+    def post(self, request):
+        '''
+        여러 숙소를 한 번에 예약한다. 하나라도 실패하면 아무것도 예약되지 않는다.
+        '''
+        try:
+            booking_requests = request.data.get('bookings') if isinstance(request.data, dict) else None
+            bookings         = create_bulk_bookings(request.user, booking_requests, BookingStatusEnum.PENDING.value)
+
+            for booking in bookings:
+                bump_booking_generations(booking.accomodation_id, booking.start_date, booking.end_date)
+
+            hold_store.release_stays(request.user.id, [(booking.accomodation_id, booking.start_date, booking.end_date) for booking in bookings])
+
+            return Response(data=BookingSerializer(bookings, many=True).data, status=status.HTTP_201_CREATED)
+
+        except Accomodation.DoesNotExist:
+            return JsonResponse({'message' : 'Invalid Accomodation'}, status=status.HTTP_400_BAD_REQUEST)
+
+        except ValidationError as e:
+            return JsonResponse({'message': e.message}, status=status.HTTP_400_BAD_REQUEST)
+
+        except KeyError:
+            return JsonResponse({'message':'Invalid Request'}, status=status.HTTP_400_BAD_REQUEST)
+
+class BookingHoldView(APIView):
+    @swagger_auto_schema(request_body=BookingHoldPostSchemaSerializer, responses={201 : BookingHoldSchemaSerializer, 400 : "Invalid Reason Message"}, tags=["Booking"])
+    @login_decorator
+    def post(self, request):
+        '''
+        결제하는 동안 숙소의 [start_date, end_date) 밤을 HOLD_TTL 동안 잡아 둔다. 그동안 다른 사용자의 예약, 예약 가능 조회에서는 막힌 날짜가 된다.
+        '''
+        try:
+            user            = request.user
+            accomodation_id = int(request.data['accomodation_id'])
+            start_date      = datetime.strptime(request.data['start_date'], '%Y-%m-%d').date()
+            end_date        = datetime.strptime(request.data['end_date'], '%Y-%m-%d').date()
+
+            if not Accomodation.objects.filter(id=accomodation_id).exists():
+                raise Accomodation.DoesNotExist
+
+            if Booking.objects.active().filter(accomodation_id=accomodation_id, start_date__lt=end_date, end_date__gt=start_date).exists():
+                raise ValidationError('Already Booked Accomodation')
+
+            hold_token, expires_at = hold_store.acquire(user.id, accomodation_id, start_date, end_date)
+
+            bump_generations([get_accomodation_generation_key(accomodation_id)])
+
+            result = {
+                'hold_token'      : hold_token,
+                'accomodation_id' : accomodation_id,
+                'start_date'      : start_date.isoformat(),
+                'end_date'        : end_date.isoformat(),
+                'expires_at'      : expires_at.isoformat()
+            }
+
+            return Response(data=result, status=status.HTTP_201_CREATED)
+
+        except Accomodation.DoesNotExist:
+            return JsonResponse({'message' : 'Invalid Accomodation'}, status=status.HTTP_400_BAD_REQUEST)
+
+        except ValidationError as e:
+            return JsonResponse({'message': e.message}, status=status.HTTP_400_BAD_REQUEST)
+
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse({'message':'Invalid Request'}, status=status.HTTP_400_BAD_REQUEST)
+
+class BookingHoldDetailView(APIView):
+    @swagger_auto_schema(manual_parameters=[BookingSwaager.hold_token], responses={204 : "No Content", 400 : 'Invalid Hold'}, tags=["Booking"])
+    @login_decorator
+    def delete(self, request, hold_token):
+        '''
+        결제를 그만두면 hold 를 바로 푼다. 풀지 않아도 HOLD_TTL 이 지나면 사라진다.
+        '''
+        hold = hold_store.release(request.user.id, hold_token)
+
+        if hold is None:
+            return JsonResponse({'message':'Invalid Hold'}, status=status.HTTP_400_BAD_REQUEST)
+
+        bump_generations([get_accomodation_generation_key(hold['accomodation_id'])])
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 class BookingDetailView(APIView):
     @swagger_auto_schema(manual_parameters=[BookingSwaager.booking_id],
                          request_body=BookingUpdateSchemaSerializer,
@@ -159,12 +320,17 @@ class BookingDetailView(APIView):
             serializer = BookingSerializer(booking, data=data, partial=True)
 
             if serializer.is_valid():
-                serializer.save()
+                booking = serializer.save()
+
+                hold_store.release_stays(user.id, [(booking.accomodation_id, booking.start_date, booking.end_date)])
                 
                 return Response(data=serializer.data, status=status.HTTP_200_OK)
 
         except (Booking.DoesNotExist, Accomodation.DoesNotExist):
             return JsonResponse({'message':'Invalid Booking Information'}, status=status.HTTP_404_NOT_FOUND)
 
+        except ValidationError as e:
+            return JsonResponse({'message': e.message}, status=status.HTTP_400_BAD_REQUEST)
+
         except KeyError:
             return JsonResponse({'message':'Invalid Request Value'}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
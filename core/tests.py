@@ -1,3 +1,437 @@
-from django.test import TestCase
+import re
+import json
+from uuid import uuid4
+from datetime import date, datetime, timedelta
+from unittest.mock import MagicMock, patch
 
-# Create your tests here.
+import jwt
+
+from django.db import connection
+from django.db.models import Q
+from django.core.cache import cache
+from django.test import TestCase, SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APITestCase, APIClient
+
+from users.models import User
+from core.utils import get_serializer_related_lookups
+from planets.serializers import PlanetSerializer, PlanetDetailSerializer
+from wishlists.serializers import WishListDetailSerializer
+from planets.availability import add_months
+from planets.utils import search_planet_ids, update_planet_search_documents, update_planet_name_grams
+from planets.models import Galaxy, PlanetTheme, Planet, PlanetImage, Accomodation, PlanetSearchDocument
+from bookings.utils import sync_booking_nights, MAX_BULK_BOOKING_SIZE
+from bookings.models import Booking, BookingStatus, BookingNight
+from wishlists.models import WishList
+from starfolio.settings import SECRET_KEY, ALGORITHM
+
+class QueryPlanTest(TestCase):
+    '''
+    엔드포인트에서 사용하는 쿼리가 인덱스를 타는지 EXPLAIN으로 확인
+    '''
+    NUM_OF_ROWS = 200
+
+    @classmethod
+    def setUpTestData(cls):
+        Galaxy.objects.create(id=1, name='우리은하')
+        PlanetTheme.objects.create(id=1, name='불')
+        BookingStatus.objects.create(id=1, status='PENDING')
+
+        User.objects.bulk_create([
+            User(id=user_id, name=f'testman{user_id}', email=f'test{user_id}@test.com', kakao_id=user_id)
+            for user_id in range(1, 11)
+        ])
+
+        Planet.objects.bulk_create([
+            Planet(id=planet_id, name=f'행성{planet_id}', thumbnail='https://test.server/thumbnail.jpg', theme_id=1, galaxy_id=1)
+            for planet_id in range(1, cls.NUM_OF_ROWS+1)
+        ])
+
+        Accomodation.objects.bulk_create([
+            Accomodation(
+                id            = accomodation_id,
+                name          = f'숙소{accomodation_id}',
+                price         = 10000*accomodation_id,
+                min_of_people = 2,
+                max_of_people = 4,
+                num_of_bed    = 2,
+                description   = '숙소입니다.',
+                planet_id     = accomodation_id
+            ) for accomodation_id in range(1, cls.NUM_OF_ROWS+1)
+        ])
+
+        start_date = date(2023, 1, 1)
+
+        Booking.objects.bulk_create([
+            Booking(
+                id                 = booking_id,
+                booking_number     = uuid4(),
+                start_date         = start_date+timedelta(days=booking_id),
+                end_date           = start_date+timedelta(days=booking_id+2),
+                number_of_adults   = 2,
+                number_of_children = 0,
+                price              = 20000,
+                user_id            = booking_id%10+1,
+                booking_status_id  = 1,
+                planet_id          = booking_id,
+                accomodation_id    = booking_id
+            ) for booking_id in range(1, cls.NUM_OF_ROWS+1)
+        ])
+
+        BookingNight.objects.bulk_create([
+            BookingNight(
+                date            = start_date+timedelta(days=booking_id+stay),
+                booking_id      = booking_id,
+                accomodation_id = booking_id
+            ) for booking_id in range(1, cls.NUM_OF_ROWS+1) for stay in range(2)
+        ])
+
+        WishList.objects.bulk_create([
+            WishList(user_id=planet_id%10+1, planet_id=planet_id)
+            for planet_id in range(1, cls.NUM_OF_ROWS+1)
+        ])
+
+        update_planet_search_documents(range(1, cls.NUM_OF_ROWS+1))
+
+        Planet.objects.create(id=cls.NUM_OF_ROWS+1, name='숙소없는행성', thumbnail='https://test.server/thumbnail.jpg', theme_id=1, galaxy_id=1)
+
+    def get_full_scans(self, queryset, table, plan=None):
+        plan = plan or queryset.explain()
+
+        if connection.vendor == 'mysql':
+            # id select_type table partitions type ...
+            return [row for row in plan.splitlines() if row.split()[2:5:2] == [table, 'ALL']]
+
+        return [row for row in plan.splitlines() if re.search(rf'SCAN (TABLE )?{table}\b', row) and 'USING' not in row]
+
+    def assertNoFullScan(self, queryset, table):
+        self.assertEqual(self.get_full_scans(queryset, table), [], queryset.explain())
+
+    def explain_view_queries(self, url, table):
+        '''
+        url 을 요청하면서 실행된 쿼리 중 table 을 읽는 쿼리의 EXPLAIN 결과
+        '''
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+
+        prefix = 'EXPLAIN ' if connection.vendor == 'mysql' else 'EXPLAIN QUERY PLAN '
+        plans  = []
+
+        for query in context.captured_queries:
+            if f'FROM "{table}"' not in query['sql'] and f'FROM `{table}`' not in query['sql']:
+                continue
+
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + query['sql'])
+                plans.append('\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall()))
+
+        self.assertTrue(plans, f'{url} : no query on {table}')
+
+        return plans
+
+    def assertViewHasNoFullScan(self, url, table, scanned_table=None):
+        for plan in self.explain_view_queries(url, table):
+            self.assertEqual(self.get_full_scans(None, scanned_table or table, plan), [], plan)
+
+    def assertViewUsesIndex(self, url, table):
+        for plan in self.explain_view_queries(url, table):
+            sorts = [row for row in plan.splitlines() if 'TEMP B-TREE' in row or 'Using filesort' in row]
+
+            self.assertEqual(self.get_full_scans(None, table, plan) + sorts, [], plan)
+
+    def test_booking_overlap_query_uses_index(self):
+        queryset = Booking.objects.filter(accomodation_id=1, start_date__lt='2023-01-05', end_date__gt='2023-01-02')
+
+        self.assertNoFullScan(queryset, 'bookings')
+
+    def test_bulk_booking_read_back_query_uses_index(self):
+        q = Q()
+
+        for booking in Booking.objects.filter(id__in=[1, 2, 3]):
+            q |= Q(accomodation_id=booking.accomodation_id, start_date=booking.start_date, end_date=booking.end_date, booking_number=booking.booking_number)
+
+        self.assertNoFullScan(Booking.objects.filter(q), 'bookings')
+
+    def test_booking_list_query_uses_index(self):
+        queryset = Booking.objects.filter(user_id=1, start_date__gte='2023-03-01').order_by('start_date', 'id')
+
+        self.assertNoFullScan(queryset, 'bookings')
+
+    def test_wishlist_query_uses_index(self):
+        queryset = WishList.objects.filter(user_id=1).order_by('created_at', 'id')
+
+        self.assertNoFullScan(queryset, 'wishlists')
+
+    def test_planet_new_sort_query_uses_index(self):
+        self.assertViewHasNoFullScan('/api/planets?sort=new&limit=10', 'planet_search_documents')
+        self.assertViewUsesIndex('/api/planets?sort=new&limit=10&cursor=', 'planet_search_documents')
+
+    def test_planet_price_cursor_pages_use_index(self):
+        for sort in ('asc', 'desc'):
+            cursor = ''
+
+            for _ in range(3):
+                self.assertViewUsesIndex(f'/api/planets?sort={sort}&limit=10&cursor={cursor}', 'planet_search_documents')
+
+                cursor = self.client.get(f'/api/planets?sort={sort}&limit=10&cursor={cursor}').json()['next']
+
+    def test_accomodation_price_query_uses_index(self):
+        queryset = Accomodation.objects.filter(planet_id=1).order_by('price')
+
+        self.assertNoFullScan(queryset, 'accomodations')
+
+    def test_planet_availability_query_uses_index(self):
+        self.assertViewHasNoFullScan('/api/planets?check-in=2023-01-05&check-out=2023-01-08', 'booking_nights')
+
+    def test_planet_name_search_query_uses_index(self):
+        queryset = PlanetSearchDocument.objects.filter(planet_id__in=search_planet_ids('행성12'))
+
+        self.assertNoFullScan(queryset, 'planet_name_grams')
+
+class SerializerRelatedLookupTest(SimpleTestCase):
+    def test_planet_serializer_lookups(self):
+        self.assertEqual(
+            get_serializer_related_lookups(PlanetSerializer()),
+            (['galaxy', 'theme'], ['planetimage_set', 'accomodation_set'])
+        )
+
+    def test_planet_detail_serializer_lookups(self):
+        self.assertEqual(
+            get_serializer_related_lookups(PlanetDetailSerializer()),
+            ([], ['accomodationimage_set'])
+        )
+
+    def test_wishlist_detail_serializer_lookups(self):
+        self.assertEqual(
+            get_serializer_related_lookups(WishListDetailSerializer()),
+            (['planet', 'planet__galaxy', 'planet__theme'], ['planet__planetimage_set', 'planet__accomodation_set'])
+        )
+
+class QueryBudgetTest(APITestCase):
+    '''
+    데이터(페이지) 크기가 늘어나도 엔드포인트별 쿼리 수가 예산을 넘거나 늘어나지 않는지 확인
+    '''
+    DATA_SIZES = (1, 5, 20)
+
+    QUERY_BUDGETS = {
+        'PlanetsView'              : 1,
+        'PlanetsView.flexible'     : 2,
+        'PlanetDetailView'         : 4,
+        'AccomodationCalendarView' : 2,
+        'PlanetAvailabilityView'   : 1,
+        'BookingView.get'          : 2,
+        'BookingView.post'         : 9,
+        'BookingBulkView'          : 8,
+        'BookingView.delete'       : 6,
+        'BookingDetailView'        : 9,
+        'WishListView.get'         : 4,
+        'WishListView.post'        : 8,
+        'KakaoLogInView'           : 1,
+        'LogOutView'               : 2,
+        'RenewalingToken'          : 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        Galaxy.objects.create(id=1, name='우리은하')
+        PlanetTheme.objects.create(id=1, name='불')
+        BookingStatus.objects.create(id=1, status='PENDING')
+
+        cls.user = User.objects.create(id=1, name='testman', email='test@test.com', kakao_id=1234567891111)
+
+    def setUp(self):
+        self.f_client = APIClient()
+        self.f_client.credentials(HTTP_AUTHORIZATION=self.get_token())
+
+    def get_token(self, weeks=0):
+        return jwt.encode({'id' : self.user.id, 'exp' : datetime.utcnow() + timedelta(days=2, weeks=weeks)}, SECRET_KEY, ALGORITHM)
+
+    def fill_planets(self, size):
+        '''
+        행성마다 이미지 2개, 숙소 2개, 위시리스트 1개, 지난 예약 1개
+        '''
+        start_id   = Planet.objects.count()+1
+        planet_ids = range(start_id, size+1)
+        start_date = date(2022, 1, 1)
+
+        Planet.objects.bulk_create([
+            Planet(id=planet_id, name=f'행성{planet_id}', thumbnail='https://test.server/thumbnail.jpg', theme_id=1, galaxy_id=1)
+            for planet_id in planet_ids
+        ])
+        PlanetImage.objects.bulk_create([
+            PlanetImage(image_url=f'https://test.server/{planet_id}-{index}.jpg', planet_id=planet_id)
+            for planet_id in planet_ids for index in range(2)
+        ])
+        Accomodation.objects.bulk_create([
+            Accomodation(
+                id            = planet_id*2-index,
+                name          = f'숙소{planet_id}-{index}',
+                price         = 10000*(index+1),
+                min_of_people = 2,
+                max_of_people = 4,
+                num_of_bed    = 2,
+                description   = '숙소입니다.',
+                planet_id     = planet_id
+            ) for planet_id in planet_ids for index in range(2)
+        ])
+        WishList.objects.bulk_create([WishList(user_id=self.user.id, planet_id=planet_id) for planet_id in planet_ids])
+        Booking.objects.bulk_create([
+            Booking(
+                booking_number     = uuid4(),
+                start_date         = start_date+timedelta(days=planet_id*3),
+                end_date           = start_date+timedelta(days=planet_id*3+2),
+                number_of_adults   = 2,
+                number_of_children = 0,
+                price              = 20000,
+                user_id            = self.user.id,
+                booking_status_id  = 1,
+                planet_id          = planet_id,
+                accomodation_id    = planet_id*2
+            ) for planet_id in planet_ids
+        ])
+
+        update_planet_search_documents(planet_ids)
+        update_planet_name_grams(planet_ids)
+
+        for booking in Booking.objects.filter(planet_id__in=planet_ids):
+            sync_booking_nights(booking)
+
+    def assertQueryBudget(self, view_name, build_request, client=None):
+        '''
+        build_request(size)는 (method, url, body)를 돌려준다. 요청 준비용 쿼리는 세지 않는다.
+        '''
+        client = client or self.f_client
+        budget = self.QUERY_BUDGETS[view_name]
+        counts = []
+
+        for size in self.DATA_SIZES:
+            self.fill_planets(size)
+
+            method, url, body = build_request(size)
+            options           = {'data' : json.dumps(body), 'content_type' : 'application/json'} if body is not None else {}
+
+            with CaptureQueriesContext(connection) as context:
+                response = getattr(client, method)(url, **options)
+
+            self.assertLess(response.status_code, 400, f'{view_name} (size={size}) : {response.content}')
+            self.assertLessEqual(len(context), budget,
+                f'{view_name} (size={size}) : {len(context)} queries > budget {budget}\n' + '\n'.join(query['sql'] for query in context.captured_queries))
+
+            counts.append(len(context))
+
+        self.assertEqual(len(set(counts)), 1, f'{view_name} query count grows with page size : {counts}')
+
+    def test_planets_view_query_budget(self):
+        self.assertQueryBudget('PlanetsView', lambda size : ('get', f'/api/planets?limit={size}&sort=asc&people=2', None))
+
+    def test_planets_view_flexible_query_budget(self):
+        month = add_months(date.today().replace(day=1), 1).strftime('%Y-%m')
+
+        self.assertQueryBudget('PlanetsView.flexible', lambda size : ('get', f'/api/planets?limit={size}&month={month}&nights=3&people=2', None))
+
+    def test_planet_detail_view_query_budget(self):
+        self.assertQueryBudget('PlanetDetailView', lambda size : ('get', f'/api/planets/{size}/accomodation/{size*2}?check-in=&check-out=', None))
+
+    def test_accomodation_calendar_view_query_budget(self):
+        self.assertQueryBudget('AccomodationCalendarView', lambda size : ('get', f'/api/planets/{size}/accomodation/{size*2}/calendar?months=6', None))
+
+    def test_planet_availability_view_query_budget(self):
+        self.assertQueryBudget('PlanetAvailabilityView', lambda size : ('get', f'/api/planets/{size}/availability?months=6', None))
+
+    def test_booking_view_get_query_budget(self):
+        self.assertQueryBudget('BookingView.get', lambda size : ('get', f'/api/bookings?my-stay=history&limit={size}', None))
+
+    def test_booking_view_post_query_budget(self):
+        def build_request(size):
+            booking = {
+                'start_date'         : f'2030-{size:02}-01',
+                'end_date'           : f'2030-{size:02}-05',
+                'number_of_adults'   : 2,
+                'number_of_children' : 0,
+                'user_request'       : '조용한 방 부탁드려요.',
+                'total_price'        : 10000,
+                'planet_id'          : 1,
+                'accomodation_id'    : 1
+            }
+
+            return 'post', '/api/bookings', booking
+
+        self.DATA_SIZES = (1, 5, 12)
+        self.assertQueryBudget('BookingView.post', build_request)
+
+    def test_booking_bulk_view_query_budget(self):
+        def build_request(size):
+            start_date = date(2030, 1, 1) + timedelta(days=size*10)
+            bookings   = [{
+                'start_date'         : start_date.isoformat(),
+                'end_date'           : (start_date + timedelta(days=3)).isoformat(),
+                'number_of_adults'   : 2,
+                'number_of_children' : 0,
+                'user_request'       : '',
+                'total_price'        : 30000,
+                'planet_id'          : planet_id,
+                'accomodation_id'    : planet_id*2-1
+            } for planet_id in range(1, min(size, MAX_BULK_BOOKING_SIZE)+1)]
+
+            return 'post', '/api/bookings/bulk', {'bookings' : bookings}
+
+        self.assertQueryBudget('BookingBulkView', build_request)
+
+    def test_booking_view_delete_query_budget(self):
+        def build_request(size):
+            booking_ids = Booking.objects.filter(user=self.user).values_list('id', flat=True)
+
+            return 'delete', '/api/bookings?' + '&'.join(f'booking-ids={booking_id}' for booking_id in booking_ids), None
+
+        self.assertQueryBudget('BookingView.delete', build_request)
+
+    def test_booking_detail_view_query_budget(self):
+        def build_request(size):
+            booking_id = Booking.objects.filter(planet_id=size).values_list('id', flat=True).get()
+
+            return 'patch', f'/api/bookings/{booking_id}', {'number_of_adults' : 3}
+
+        self.assertQueryBudget('BookingDetailView', build_request)
+
+    def test_wishlist_view_get_query_budget(self):
+        self.assertQueryBudget('WishListView.get', lambda size : ('get', f'/api/wishlists?limit={size}', None))
+
+    def test_wishlist_view_post_query_budget(self):
+        self.assertQueryBudget('WishListView.post', lambda size : ('post', '/api/wishlists', {'planet_id' : size}))
+
+    @patch('users.views.requests')
+    def test_kakao_login_view_query_budget(self, mocked_requests):
+        class MockedResponse:
+            def json(self):
+                return {
+                    'id' : 1234567891111,
+                    'kakao_account' : {
+                        'email' : 'test@test.com'
+                    },
+                    'properties' : {
+                        'nickname' : 'testman'
+                    }
+                }
+
+        mocked_requests.get = MagicMock(return_value=MockedResponse())
+
+        kakao_client = APIClient()
+        kakao_client.credentials(HTTP_AUTHORIZATION='kakao_token')
+
+        self.assertQueryBudget('KakaoLogInView', lambda size : ('get', '/api/users/kakao-login', None), client=kakao_client)
+
+    def test_logout_view_query_budget(self):
+        self.assertQueryBudget('LogOutView', lambda size : ('get', '/api/users/logout', None))
+
+    def test_renewaling_token_query_budget(self):
+        def build_request(size):
+            refresh_token           = self.get_token(weeks=size)
+            self.user.refresh_token = refresh_token
+            self.user.save()
+
+            return 'post', '/api/users/refresh-token', {'refresh_token' : refresh_token}
+
+        self.assertQueryBudget('RenewalingToken', build_request)
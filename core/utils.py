@@ -0,0 +1,235 @@
+import json
+import base64
+import binascii
+from decimal import Decimal
+from datetime import date
+
+from django.db.models import Q
+from django.core.exceptions import ValidationError
+
+from rest_framework import serializers
+
+def serialize_cursor_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+
+    if isinstance(value, Decimal):
+        return str(value)
+
+    raise TypeError(f'{type(value).__name__} is not cursor serializable')
+
+def encode_cursor(ordering, values, reverse=False, segment=None):
+    payload = {'ordering' : ordering, 'values' : values, 'reverse' : reverse}
+
+    if segment is not None:
+        payload['segment'] = segment
+
+    payload = json.dumps(payload, default=serialize_cursor_value)
+
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('utf-8')
+
+def decode_cursor_payload(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')))
+
+        if not isinstance(payload, dict):
+            raise ValidationError('Invalid Cursor')
+
+        return payload
+
+    except (ValueError, TypeError, binascii.Error):
+        raise ValidationError('Invalid Cursor')
+
+def decode_cursor(model, ordering, cursor, payload=None):
+    '''
+    커서 값은 ordering 필드의 타입으로 바꿔서 돌려준다. 바꿀 수 없는 값이면 Invalid Cursor
+    '''
+    try:
+        payload = payload or decode_cursor_payload(cursor)
+        values  = payload['values']
+
+        if payload['ordering'] != ordering or not isinstance(values, list) or len(values) != len(ordering):
+            raise ValidationError('Invalid Cursor')
+
+        values = [model._meta.get_field(field.lstrip('-')).to_python(value) for field, value in zip(ordering, values)]
+
+        if any(value is None or isinstance(value, Decimal) and not value.is_finite() for value in values):
+            raise ValidationError('Invalid Cursor')
+
+        return values, bool(payload.get('reverse'))
+
+    except (TypeError, ValueError, KeyError, ValidationError):
+        raise ValidationError('Invalid Cursor')
+
+def get_keyset_filter(ordering, values):
+    '''
+    (a, b) > (x, y) 를 a >= x AND (a > x OR (a = x AND b > y)) 형태로 풀어서 만든다.
+    앞의 a >= x 는 (a, b) 인덱스를 범위로 읽게 하는 조건
+    '''
+    first = ordering[0]
+    bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}" : values[0]})
+    q     = Q()
+
+    for index, field in enumerate(ordering):
+        name   = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+
+        condition = Q(**{f'{name}__{lookup}' : values[index]})
+
+        for prev_field, prev_value in zip(ordering[:index], values[:index]):
+            condition &= Q(**{prev_field.lstrip('-') : prev_value})
+
+        q |= condition
+
+    return bound & q
+
+def reverse_ordering(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+def get_cursor_values(row, ordering):
+    if isinstance(row, dict):
+        return [row[field.lstrip('-')] for field in ordering]
+
+    return [getattr(row, field.lstrip('-')) for field in ordering]
+
+def paginate_by_cursor(queryset, ordering, cursor, limit):
+    '''
+    ordering의 마지막 필드는 유일한 값(id)이어야 한다. .values() 쿼리셋도 받는다.
+    prev 커서는 ordering을 뒤집어서 조회한 뒤 결과를 다시 뒤집는다.
+    '''
+    reverse       = False
+    scan_ordering = ordering
+
+    if cursor:
+        values, reverse = decode_cursor(queryset.model, ordering, cursor)
+        scan_ordering   = reverse_ordering(ordering) if reverse else ordering
+        queryset        = queryset.filter(get_keyset_filter(scan_ordering, values))
+
+    rows     = list(queryset.order_by(*scan_ordering)[:limit+1])
+    has_more = len(rows) > limit
+    rows     = rows[:limit]
+
+    if reverse:
+        rows.reverse()
+
+    next_cursor = None
+    prev_cursor = None
+
+    if rows and (has_more if not reverse else cursor):
+        next_cursor = encode_cursor(ordering, get_cursor_values(rows[-1], ordering))
+
+    if rows and (has_more if reverse else cursor):
+        prev_cursor = encode_cursor(ordering, get_cursor_values(rows[0], ordering), reverse=True)
+
+    return rows, next_cursor, prev_cursor
+
+def paginate_by_segments(segments, cursor, limit):
+    '''
+    segments : [(queryset, ordering), ...] 앞 구간을 끝까지 읽은 뒤 다음 구간을 이어서 읽는다.
+    NULL 처럼 인덱스 순서로 이어 붙일 수 없는 값을 따로 구간으로 나누면, 구간마다 인덱스 범위만 읽는다.
+    커서에는 구간 번호가 같이 들어간다. 각 ordering의 마지막 필드는 유일한 값(id)이어야 한다.
+    '''
+    segment = 0
+    values  = None
+    reverse = False
+
+    if cursor:
+        payload = decode_cursor_payload(cursor)
+        segment = payload.get('segment')
+
+        if not isinstance(segment, int) or not 0 <= segment < len(segments):
+            raise ValidationError('Invalid Cursor')
+
+        values, reverse = decode_cursor(segments[segment][0].model, segments[segment][1], cursor, payload)
+
+    indexes = range(segment, -1, -1) if reverse else range(segment, len(segments))
+    rows    = []
+
+    for index in indexes:
+        queryset, ordering = segments[index]
+        scan_ordering      = reverse_ordering(ordering) if reverse else ordering
+
+        if index == segment and values is not None:
+            queryset = queryset.filter(get_keyset_filter(scan_ordering, values))
+
+        rows += [(index, row) for row in queryset.order_by(*scan_ordering)[:limit+1-len(rows)]]
+
+        if len(rows) > limit:
+            break
+
+    has_more = len(rows) > limit
+    rows     = rows[:limit]
+
+    if reverse:
+        rows.reverse()
+
+    next_cursor = None
+    prev_cursor = None
+
+    if rows and (has_more if not reverse else cursor):
+        index, row  = rows[-1]
+        next_cursor = encode_cursor(segments[index][1], get_cursor_values(row, segments[index][1]), segment=index)
+
+    if rows and (has_more if reverse else cursor):
+        index, row  = rows[0]
+        prev_cursor = encode_cursor(segments[index][1], get_cursor_values(row, segments[index][1]), reverse=True, segment=index)
+
+    return [row for _, row in rows], next_cursor, prev_cursor
+
+def get_relation_field(model, name):
+    for field in model._meta.get_fields():
+        if not field.is_relation:
+            continue
+
+        if field.name == name or (field.auto_created and not field.concrete and field.get_accessor_name() == name):
+            return field
+
+    return None
+
+def get_serializer_related_lookups(serializer, prefix='', prefetched=False):
+    '''
+    중첩 시리얼라이저를 따라가며 (select_related, prefetch_related) lookup을 만든다.
+    prefetch 아래에 있는 관계는 모두 prefetch lookup이 된다.
+    '''
+    select_related   = []
+    prefetch_related = []
+    model            = serializer.Meta.model
+
+    for field in serializer.fields.values():
+        child = field.child if isinstance(field, serializers.ListSerializer) else field
+
+        if not isinstance(child, serializers.ModelSerializer) or field.source == '*':
+            continue
+
+        relation = get_relation_field(model, field.source)
+
+        if relation is None:
+            continue
+
+        lookup        = f'{prefix}{field.source}'
+        is_single     = relation.many_to_one or relation.one_to_one
+        is_prefetched = prefetched or not is_single
+
+        if is_prefetched:
+            prefetch_related.append(lookup)
+
+        else:
+            select_related.append(lookup)
+
+        nested_select_related, nested_prefetch_related = get_serializer_related_lookups(child, f'{lookup}__', is_prefetched)
+
+        select_related   += nested_select_related
+        prefetch_related += nested_prefetch_related
+
+    return select_related, prefetch_related
+
+def optimize_for_serializer(queryset, serializer_class):
+    select_related, prefetch_related = get_serializer_related_lookups(serializer_class())
+
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+
+    return queryset
@@ -0,0 +1,85 @@
+from bisect import bisect_right
+from datetime import timedelta
+
+def merge_intervals(intervals):
+    '''
+    [start, end) 날짜 구간들을 정렬하고 겹치거나 맞닿은 구간을 합친다. 빈 구간(start >= end)은 버린다.
+    '''
+    merged = []
+
+    for start, end in sorted(interval for interval in intervals if interval[0] < interval[1]):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+            continue
+
+        merged.append((start, end))
+
+    return merged
+
+def get_interval_ends(intervals):
+    return [end for _, end in intervals]
+
+def has_overlap(intervals, start, end, ends=None):
+    '''
+    intervals : merge_intervals 결과. 정렬되어 있고 서로 겹치지 않으므로 end도 정렬되어 있다.
+    [start, end) 와 겹치는 구간이 있는지 bisect로 확인한다.
+    '''
+    if start >= end:
+        return False
+
+    ends  = ends if ends is not None else get_interval_ends(intervals)
+    index = bisect_right(ends, start)
+
+    return index < len(intervals) and intervals[index][0] < end
+
+def expand_intervals(intervals):
+    '''
+    구간을 하루 단위 "%Y-%m-%d" 문자열 리스트로 펼친다. (API 응답용)
+    '''
+    dates = []
+
+    for start, end in intervals:
+        dates += [(start+timedelta(days=night)).isoformat() for night in range((end-start).days)]
+
+    return dates
+
+def compress_dates(dates):
+    '''
+    날짜(date) 모음을 연속된 [start, end) 구간으로 묶는다.
+    '''
+    return merge_intervals((night, night+timedelta(days=1)) for night in set(dates))
+
+def clip_intervals(intervals, start, end):
+    '''
+    구간들을 [start, end) 안으로 자른다.
+    '''
+    return [(max(interval_start, start), min(interval_end, end)) for interval_start, interval_end in intervals
+            if interval_start < end and interval_end > start]
+
+def add_months(month, months):
+    '''
+    month : 매월 1일 date
+    '''
+    index = month.year * 12 + month.month - 1 + months
+
+    return month.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+def find_free_window(intervals, start, end, nights):
+    '''
+    [start, end) 안에서 intervals와 겹치지 않는 가장 이른 nights박 (check_in, check_out). 없으면 None
+    intervals가 정렬, 병합되어 있으므로 구간 사이의 빈 틈만 훑는다.
+    '''
+    stay       = timedelta(days=nights)
+    free_start = start
+
+    for interval_start, interval_end in clip_intervals(intervals, start, end):
+        if interval_start - free_start >= stay:
+            return free_start, free_start + stay
+
+        free_start = max(free_start, interval_end)
+
+    if end - free_start >= stay:
+        return free_start, free_start + stay
+
+    return None
@@ -0,0 +1,63 @@
+import timeit
+
+from django.db import transaction
+from django.core.management.base import BaseCommand
+
+from planets.models import Galaxy, PlanetTheme, Planet, PlanetImage, Accomodation
+from planets.serializers import PlanetSerializer, serialize_planets
+from core.utils import optimize_for_serializer
+
+class Command(BaseCommand):
+    help = 'PlanetSerializer와 .values() 기반 serialize_planets 속도 비교 (임시 데이터는 롤백)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        size   = options['size']
+        repeat = options['repeat']
+
+        with transaction.atomic():
+            self.create_planets(size)
+
+            planets = Planet.objects.order_by('id')[:size]
+
+            serializer_time = min(timeit.repeat(
+                lambda : PlanetSerializer(optimize_for_serializer(planets, PlanetSerializer), many=True).data, number=1, repeat=repeat
+            ))
+            values_time = min(timeit.repeat(lambda : serialize_planets(planets), number=1, repeat=repeat))
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'planets          : {size}')
+        self.stdout.write(f'PlanetSerializer : {serializer_time*1000:.1f} ms')
+        self.stdout.write(f'serialize_planets: {values_time*1000:.1f} ms')
+        self.stdout.write(f'speedup          : {serializer_time/values_time:.1f}x')
+
+    def create_planets(self, size):
+        galaxy = Galaxy.objects.create(name='benchmark')
+        theme  = PlanetTheme.objects.create(name='benchmark')
+
+        planets = Planet.objects.bulk_create([
+            Planet(name=f'benchmark{index}', thumbnail='https://benchmark/thumbnail.jpg', theme=theme, galaxy=galaxy)
+            for index in range(size)
+        ])
+
+        planets = Planet.objects.filter(galaxy=galaxy)
+
+        PlanetImage.objects.bulk_create([
+            PlanetImage(image_url=f'https://benchmark/{planet.id}-{index}.jpg', planet=planet)
+            for planet in planets for index in range(3)
+        ])
+        Accomodation.objects.bulk_create([
+            Accomodation(
+                name          = f'benchmark{planet.id}-{index}',
+                price         = 10000*(index+1),
+                min_of_people = 2,
+                max_of_people = 4,
+                num_of_bed    = 2,
+                description   = 'benchmark',
+                planet        = planet
+            ) for planet in planets for index in range(2)
+        ])
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='planet',
+            index=models.Index(fields=['created_at'], name='planets_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accomodation',
+            index=models.Index(fields=['planet', 'price'], name='accomodations_planet_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accomodation',
+            index=models.Index(fields=['price'], name='accomodations_price_idx'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.0.3 on 2026-10-18 16:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_planet_search_documents(apps, schema_editor):
+    Planet               = apps.get_model('planets', 'Planet')
+    PlanetSearchDocument = apps.get_model('planets', 'PlanetSearchDocument')
+
+    planets = Planet.objects.select_related('galaxy', 'theme').prefetch_related('planetimage_set', 'accomodation_set')
+
+    for planet in planets.iterator(chunk_size=500):
+        images        = sorted(planet.planetimage_set.all(), key=lambda image: image.id)
+        accomodations = sorted(planet.accomodation_set.all(), key=lambda accomodation: accomodation.id)
+        prices        = [accomodation.price for accomodation in accomodations]
+
+        PlanetSearchDocument.objects.create(
+            planet_id     = planet.id,
+            name          = planet.name,
+            thumbnail     = planet.thumbnail,
+            galaxy_id     = planet.galaxy_id,
+            galaxy_name   = planet.galaxy.name,
+            theme_id      = planet.theme_id,
+            theme_name    = planet.theme.name,
+            image_urls    = [image.image_url for image in images],
+            accomodations = [
+                {
+                    'min_of_people' : accomodation.min_of_people,
+                    'max_of_people' : accomodation.max_of_people,
+                    'price'         : f'{accomodation.price:.2f}'
+                } for accomodation in accomodations
+            ],
+            min_price     = min(prices, default=None),
+            max_price     = max(prices, default=None),
+            max_of_people = max([accomodation.max_of_people for accomodation in accomodations], default=None),
+            created_at    = planet.created_at
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planets', '0002_planet_accomodation_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanetSearchDocument',
+            fields=[
+                ('planet', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to='planets.planet')),
+                ('name', models.CharField(max_length=45)),
+                ('thumbnail', models.URLField(max_length=1000)),
+                ('galaxy_name', models.CharField(max_length=45)),
+                ('theme_name', models.CharField(max_length=45)),
+                ('image_urls', models.JSONField(default=list)),
+                ('accomodations', models.JSONField(default=list)),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=11, null=True)),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=11, null=True)),
+                ('max_of_people', models.PositiveIntegerField(null=True)),
+                ('created_at', models.DateTimeField()),
+                ('galaxy', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='planets.galaxy')),
+                ('theme', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='planets.planettheme')),
+            ],
+            options={
+                'db_table': 'planet_search_documents',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='planetsearchdocument',
+            index=models.Index(fields=['created_at'], name='planet_docs_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planetsearchdocument',
+            index=models.Index(fields=['min_price'], name='planet_docs_min_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planetsearchdocument',
+            index=models.Index(fields=['max_price'], name='planet_docs_max_price_idx'),
+        ),
+        migrations.RunPython(backfill_planet_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.0.3 on 2026-10-18 16:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_planet_name_grams(apps, schema_editor):
+    Planet         = apps.get_model('planets', 'Planet')
+    PlanetNameGram = apps.get_model('planets', 'PlanetNameGram')
+
+    for planet in Planet.objects.iterator(chunk_size=500):
+        name  = planet.name.lower()
+        grams = {name[start:start+size] for size in range(1, 4) for start in range(len(name)-size+1)}
+
+        PlanetNameGram.objects.bulk_create([PlanetNameGram(gram=gram, planet_id=planet.id) for gram in grams])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planets', '0003_planetsearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanetNameGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('planet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='planets.planet')),
+            ],
+            options={
+                'db_table': 'planet_name_grams',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='planetnamegram',
+            index=models.Index(fields=['gram', 'planet'], name='planet_name_grams_gram_idx'),
+        ),
+        migrations.RunPython(backfill_planet_name_grams, migrations.RunPython.noop),
+    ]
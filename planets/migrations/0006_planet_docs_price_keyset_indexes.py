@@ -0,0 +1,29 @@
+# Generated by Django 4.0.3 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planets', '0005_accomodationimage_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='planetsearchdocument',
+            name='planet_docs_min_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='planetsearchdocument',
+            name='planet_docs_max_price_idx',
+        ),
+        migrations.AddIndex(
+            model_name='planetsearchdocument',
+            index=models.Index(fields=['min_price', 'planet'], name='planet_docs_min_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planetsearchdocument',
+            index=models.Index(fields=['max_price', 'planet'], name='planet_docs_max_price_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.3 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planets', '0006_planet_docs_price_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='planetsearchdocument',
+            name='planet_docs_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='planetsearchdocument',
+            index=models.Index(fields=['created_at', 'planet'], name='planet_docs_created_idx'),
+        ),
+    ]
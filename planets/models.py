@@ -22,6 +22,22 @@ class Planet(TimeStamp):
 
     class Meta:
         db_table = 'planets'
+        indexes  = [
+            models.Index(fields=['created_at'], name='planets_created_idx'),
+        ]
+
+class PlanetNameGram(models.Model):
+    '''
+    행성 이름 검색용 1~3글자 n-gram (소문자)
+    '''
+    gram   = models.CharField(max_length=3)
+    planet = models.ForeignKey('Planet', on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'planet_name_grams'
+        indexes  = [
+            models.Index(fields=['gram', 'planet'], name='planet_name_grams_gram_idx'),
+        ]
 
 class PlanetImage(models.Model):
     image_url = models.URLField(max_length=1000)
@@ -41,10 +57,41 @@ class Accomodation(TimeStamp):
 
     class Meta:
         db_table = 'accomodations'
+        indexes  = [
+            models.Index(fields=['planet', 'price'], name='accomodations_planet_price_idx'),
+            models.Index(fields=['price'], name='accomodations_price_idx'),
+        ]
 
 class AccomodationImage(models.Model):
     image_url    = models.URLField(max_length=1000)
     accomodation = models.ForeignKey('Accomodation', on_delete=models.CASCADE)
+    updated_at   = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'accomodation_images'
+
+class PlanetSearchDocument(models.Model):
+    '''
+    행성 리스트 조회용 비정규화 테이블 (planets/signals.py 에서 동기화)
+    '''
+    planet        = models.OneToOneField('Planet', primary_key=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    name          = models.CharField(max_length=45)
+    thumbnail     = models.URLField(max_length=1000)
+    galaxy        = models.ForeignKey('Galaxy', on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    galaxy_name   = models.CharField(max_length=45)
+    theme         = models.ForeignKey('PlanetTheme', on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    theme_name    = models.CharField(max_length=45)
+    image_urls    = models.JSONField(default=list)
+    accomodations = models.JSONField(default=list)
+    min_price     = models.DecimalField(max_digits=11, decimal_places=2, null=True)
+    max_price     = models.DecimalField(max_digits=11, decimal_places=2, null=True)
+    max_of_people = models.PositiveIntegerField(null=True)
+    created_at    = models.DateTimeField()
+
+    class Meta:
+        db_table = 'planet_search_documents'
+        indexes  = [
+            models.Index(fields=['created_at', 'planet'], name='planet_docs_created_idx'),
+            models.Index(fields=['min_price', 'planet'], name='planet_docs_min_price_idx'),
+            models.Index(fields=['max_price', 'planet'], name='planet_docs_max_price_idx'),
+        ]
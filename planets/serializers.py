@@ -1,9 +1,11 @@
 from datetime import datetime, timedelta
+from collections import defaultdict
 
 from rest_framework import serializers
 
 from bookings.models import Booking
 
+from .availability import merge_intervals, expand_intervals
 from .models import Planet, Galaxy, PlanetTheme, PlanetImage, Accomodation, AccomodationImage
 
 class AccomodationSerializer(serializers.ModelSerializer):
@@ -36,12 +38,89 @@ class PlanetSerializer(serializers.ModelSerializer):
         model = Planet
         fields = ('id', 'name', 'thumbnail', 'galaxy', 'theme', 'planetimage_set', 'accomodation_set')
 
+class PlanetSearchDocumentSerializer(serializers.BaseSerializer):
+    '''
+    PlanetSearchDocument 한 줄을 PlanetSerializer와 같은 모양으로 변환. stay_price 가 annotate 되어 있으면 함께 준다.
+    '''
+    stay_price_field = serializers.DecimalField(max_digits=13, decimal_places=2)
+
+    def to_representation(self, instance):
+        data = {
+            'id'               : instance.planet_id,
+            'name'             : instance.name,
+            'thumbnail'        : instance.thumbnail,
+            'galaxy'           : {'name' : instance.galaxy_name},
+            'theme'            : {'name' : instance.theme_name},
+            'planetimage_set'  : [{'image_url' : image_url} for image_url in instance.image_urls],
+            'accomodation_set' : instance.accomodations
+        }
+
+        if hasattr(instance, 'stay_price'):
+            data['stay_price'] = self.stay_price_field.to_representation(instance.stay_price) if instance.stay_price is not None else None
+
+        return data
+
+PLANET_VALUES = ('id', 'name', 'thumbnail', 'galaxy__name', 'theme__name')
+
+def serialize_planets(planets):
+    '''
+    PlanetSerializer(planets, many=True).data 와 같은 결과를 모델 인스턴스 없이 .values()로 만든다. [읽기 전용]
+    '''
+    return serialize_planet_rows(list(planets.values(*PLANET_VALUES)))
+
+def serialize_planet_rows(planet_rows):
+    '''
+    planet_rows : PLANET_VALUES 키를 가진 dict 리스트
+    '''
+    planet_ids  = [planet['id'] for planet in planet_rows]
+    price_field = AccomodationSerializer().fields['price']
+
+    images        = defaultdict(list)
+    accomodations = defaultdict(list)
+
+    for image in PlanetImage.objects.filter(planet_id__in=planet_ids).order_by('id').values('planet_id', 'image_url'):
+        images[image['planet_id']].append({'image_url' : image['image_url']})
+
+    for accomodation in Accomodation.objects.filter(planet_id__in=planet_ids).order_by('id')\
+                                            .values('planet_id', 'min_of_people', 'max_of_people', 'price'):
+        accomodations[accomodation['planet_id']].append({
+            'min_of_people' : accomodation['min_of_people'],
+            'max_of_people' : accomodation['max_of_people'],
+            'price'         : price_field.to_representation(accomodation['price'])
+        })
+
+    return [
+        {
+            'id'               : planet['id'],
+            'name'             : planet['name'],
+            'thumbnail'        : planet['thumbnail'],
+            'galaxy'           : {'name' : planet['galaxy__name']},
+            'theme'            : {'name' : planet['theme__name']},
+            'planetimage_set'  : images[planet['id']],
+            'accomodation_set' : accomodations[planet['id']]
+        } for planet in planet_rows
+    ]
+
 class AccomodationImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = AccomodationImage
         fields = ('image_url', )
 
+def get_booked_intervals(accomodation):
+    '''
+    오늘부터 186일 안의 취소되지 않은 예약을 merge_intervals 한 [start, end) 구간 리스트
+    '''
+    unavailable_bookings = Booking.objects.active().filter(accomodation=accomodation,
+                                                           start_date__lte=datetime.today()+timedelta(days=186),
+                                                           end_date__gte=datetime.today()
+                            ).values_list('start_date', 'end_date')
+
+    return merge_intervals(unavailable_bookings)
+
 class PlanetDetailSerializer(serializers.ModelSerializer):
+    '''
+    context['booked_intervals'] 가 있으면 invalid_dates 를 그 구간으로 만들고, 없으면 직접 조회한다.
+    '''
     invalid_dates = serializers.SerializerMethodField('get_invalid_dates')
     accomodationimage_set = AccomodationImageSerializer(read_only=True, many=True)
 
@@ -58,17 +137,23 @@ class PlanetDetailSerializer(serializers.ModelSerializer):
         }
 
     def get_invalid_dates(self, obj):
-        unavailable_bookings = Booking.objects.filter(accomodation=obj,
-                                                      start_date__lte=datetime.today()+timedelta(days=186),
-                                                      end_date__gte=datetime.today()
-                                )
-
-        invalid_dates = []
-
-        for unavailable_booking in unavailable_bookings:
-            booked_out_stays = (unavailable_booking.end_date - unavailable_booking.start_date).days
-            invalid_dates   += [datetime.strftime(unavailable_booking.start_date+timedelta(days=booked_out_stay), "%Y-%m-%d") for booked_out_stay in range(booked_out_stays)]
-        
-        obj.invalid_dates = invalid_dates
-
-        return obj.invalid_dates
\ No newline at end of file
+        booked_intervals = self.context.get('booked_intervals')
+
+        if booked_intervals is None:
+            booked_intervals = get_booked_intervals(obj)
+
+        return expand_intervals(booked_intervals)
+
+class AvailabilityCheckSchemaSerializer(serializers.Serializer):
+    '''
+    숙소 예약 가능 여부 조회 스키마 시리얼라이저 [Only Use Swagger]
+    '''
+    accomodation_id = serializers.IntegerField()
+    check_in        = serializers.DateField()
+    check_out       = serializers.DateField()
+
+class AvailabilityBatchSchemaSerializer(serializers.Serializer):
+    '''
+    숙소 예약 가능 여부 일괄 조회 스키마 시리얼라이저, 최대 100개 [Only Use Swagger]
+    '''
+    checks = AvailabilityCheckSchemaSerializer(many=True)
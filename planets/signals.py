@@ -0,0 +1,32 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+
+from .utils import update_planet_search_documents, update_planet_name_grams, bump_catalog_generation
+from .models import Galaxy, PlanetTheme, Planet, PlanetImage, Accomodation, PlanetSearchDocument
+
+@receiver(post_save, sender=Planet)
+def sync_planet_document(sender, instance, **kwargs):
+    update_planet_search_documents([instance.id])
+    update_planet_name_grams([instance.id])
+
+@receiver(post_delete, sender=Planet)
+def delete_planet_document(sender, instance, **kwargs):
+    PlanetSearchDocument.objects.filter(planet_id=instance.id).delete()
+    bump_catalog_generation()
+
+@receiver(post_save, sender=PlanetImage)
+@receiver(post_delete, sender=PlanetImage)
+@receiver(post_save, sender=Accomodation)
+@receiver(post_delete, sender=Accomodation)
+def sync_planet_document_of_children(sender, instance, **kwargs):
+    update_planet_search_documents([instance.planet_id])
+
+@receiver(post_save, sender=Galaxy)
+def sync_galaxy_name(sender, instance, **kwargs):
+    PlanetSearchDocument.objects.filter(galaxy_id=instance.id).update(galaxy_name=instance.name)
+    bump_catalog_generation()
+
+@receiver(post_save, sender=PlanetTheme)
+def sync_theme_name(sender, instance, **kwargs):
+    PlanetSearchDocument.objects.filter(theme_id=instance.id).update(theme_name=instance.name)
+    bump_catalog_generation()
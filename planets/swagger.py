@@ -6,5 +6,10 @@ class PlanetSwaager:
     sort      = openapi.Parameter('sort', openapi.IN_QUERY, required=False, type=openapi.TYPE_STRING)
     offset    = openapi.Parameter('offset', openapi.IN_QUERY, required=False, type=openapi.TYPE_INTEGER)
     limit     = openapi.Parameter('limit', openapi.IN_QUERY, required=False, type=openapi.TYPE_INTEGER)
+    cursor    = openapi.Parameter('cursor', openapi.IN_QUERY, required=False, type=openapi.TYPE_STRING)
     planet_id = openapi.Parameter('planet_id', openapi.IN_PATH, required=True, type=openapi.TYPE_INTEGER)
-    accomodation_id = openapi.Parameter('accomodation_id', openapi.IN_PATH, required=True, type=openapi.TYPE_INTEGER)
\ No newline at end of file
+    accomodation_id = openapi.Parameter('accomodation_id', openapi.IN_PATH, required=True, type=openapi.TYPE_INTEGER)
+    month     = openapi.Parameter('month', openapi.IN_QUERY, required=False, type=openapi.TYPE_STRING, description='%Y-%m')
+    months    = openapi.Parameter('months', openapi.IN_QUERY, required=False, type=openapi.TYPE_INTEGER)
+    nights    = openapi.Parameter('nights', openapi.IN_QUERY, required=False, type=openapi.TYPE_INTEGER, description='month 안에서 nights박')
+    facets    = openapi.Parameter('facets', openapi.IN_QUERY, required=False, type=openapi.TYPE_INTEGER, description='1이면 은하, 테마, 가격 구간별 개수를 함께 준다')
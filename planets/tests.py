@@ -1,13 +1,30 @@
+import json
+import random
 from uuid import uuid4
+from decimal import Decimal
+from datetime import date, datetime, timedelta
 
+import jwt
 import bcrypt
 
+from django.test import SimpleTestCase
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+
 from rest_framework.test import APITestCase, APIClient
+from rest_framework.renderers import JSONRenderer
 
 from users.models import User
+from bookings.holds import HoldStore, HOLD_CACHE_ALIAS
 from bookings.models import Booking, BookingStatus
+from bookings.utils import sync_booking_nights, check_validation_request
+from core.utils import encode_cursor
+from starfolio.settings import SECRET_KEY, ALGORITHM
 
-from .models import Accomodation, AccomodationImage, Planet, PlanetImage, PlanetTheme, Galaxy
+from .utils import check_valid_date, update_planet_search_documents, update_planet_name_grams, MAX_AVAILABILITY_BATCH_SIZE, MAX_SEARCH_NIGHTS
+from .availability import merge_intervals, has_overlap, expand_intervals, compress_dates, add_months, find_free_window
+from .serializers import get_booked_intervals, PlanetSerializer, PlanetDetailSerializer, serialize_planets
+from .models import Accomodation, AccomodationImage, Planet, PlanetImage, PlanetTheme, Galaxy, PlanetSearchDocument
 
 class PlanetListTest(APITestCase):
     maxDiff = None
@@ -96,6 +113,39 @@ class PlanetListTest(APITestCase):
             )
         ])
 
+        update_planet_search_documents([1, 2])
+        update_planet_name_grams([1, 2])
+
+        user = User.objects.create(
+            id       = 1,
+            name     = 'testman',
+            email    = 'test@test.com',
+            kakao_id = 12345678911
+        )
+
+        BookingStatus.objects.create(
+            id     = 1,
+            status = 'PENDING'
+        )
+
+        booking = Booking.objects.create(
+            id                 = 1,
+            booking_number     = uuid4(),
+            start_date         = '2023-05-10',
+            end_date           = '2023-05-13',
+            price              = 2500000,
+            number_of_adults   = 2,
+            number_of_children = 0,
+            user_request       = '',
+            user               = user,
+            booking_status_id  = 1,
+            planet_id          = 1,
+            accomodation_id    = 1
+        )
+        booking.refresh_from_db()
+
+        sync_booking_nights(booking)
+
     def test_success_planet_list_view_without_any_condition(self):
         response = self.client.get('/api/planets')
         
@@ -254,6 +304,32 @@ class PlanetListTest(APITestCase):
             ]
         )
 
+    def test_success_planet_list_view_with_prefix_and_infix_searching(self):
+        response = self.client.get('/api/planets?searching=멋진')
+
+        self.assertEqual([planet['id'] for planet in response.json()], [2])
+
+        response = self.client.get('/api/planets?searching=행성')
+
+        self.assertEqual([planet['id'] for planet in response.json()], [1, 2])
+
+        response = self.client.get('/api/planets?searching=쁜행성이')
+
+        self.assertEqual(response.json(), [])
+
+    def test_success_planet_list_view_with_searching_after_rename(self):
+        planet      = Planet.objects.get(id=1)
+        planet.name = 'Blue Planet'
+        planet.save()
+
+        response = self.client.get('/api/planets?searching=planet')
+
+        self.assertEqual([planet['id'] for planet in response.json()], [1])
+
+        response = self.client.get('/api/planets?searching=이쁜')
+
+        self.assertEqual(response.json(), [])
+
     def test_success_planet_list_view_with_sort(self):
         response = self.client.get('/api/planets?sort=asc')
         
@@ -313,6 +389,310 @@ class PlanetListTest(APITestCase):
             ]
         )
 
+    def test_success_planet_list_view_with_date_filter(self):
+        response = self.client.get('/api/planets?check-in=2023-05-12&check-out=2023-05-14')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([planet['id'] for planet in response.json()], [2])
+
+    def test_success_planet_list_view_with_date_filter_shows_planet_with_free_accomodation(self):
+        Accomodation.objects.create(
+            id            = 3,
+            name          = '작은방',
+            price         = 1000000.00,
+            min_of_people = 1,
+            max_of_people = 2,
+            num_of_bed    = 1,
+            description   = '작아요.',
+            planet_id     = 1
+        )
+
+        response = self.client.get('/api/planets?check-in=2023-05-12&check-out=2023-05-14')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({planet['id'] : planet['stay_price'] for planet in response.json()}, {1 : '2000000.00', 2 : '400000.00'})
+
+        response = self.client.get('/api/planets?check-in=2023-05-12&check-out=2023-05-14&people=3')
+
+        self.assertEqual([planet['id'] for planet in response.json()], [2])
+
+    def test_success_planet_list_view_with_date_filter_on_check_out_day(self):
+        response = self.client.get('/api/planets?check-in=2023-05-13&check-out=2023-05-15')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([planet['id'] for planet in response.json()], [1, 2])
+
+    def test_success_planet_list_view_with_cursor(self):
+        response = self.client.get('/api/planets?sort=new&limit=1&cursor=')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([planet['id'] for planet in response.json()['results']], [2])
+
+        response = self.client.get(f'/api/planets?sort=new&limit=1&cursor={response.json()["next"]}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([planet['id'] for planet in response.json()['results']], [1])
+        self.assertIsNone(response.json()['next'])
+
+    def test_success_planet_list_view_with_cursor_and_price_sort(self):
+        planet_ids = []
+        cursor     = ''
+
+        while cursor is not None:
+            response    = self.client.get(f'/api/planets?sort=asc&limit=1&cursor={cursor}')
+            planet_ids += [planet['id'] for planet in response.json()['results']]
+            cursor      = response.json()['next']
+
+        self.assertEqual(planet_ids, [2, 1])
+
+    def test_success_planet_list_view_with_cursor_and_price_sort_without_price(self):
+        for planet_id in (3, 4):
+            Planet.objects.create(id=planet_id, name=f'빈행성{planet_id}', thumbnail='https://test.server/thumbnail.jpg', theme_id=1, galaxy_id=1)
+
+        for sort in ('asc', 'desc'):
+            expected   = [planet['id'] for planet in self.client.get(f'/api/planets?sort={sort}').json()]
+            planet_ids = []
+            cursor     = ''
+
+            while cursor is not None:
+                response    = self.client.get(f'/api/planets?sort={sort}&limit=1&cursor={cursor}').json()
+                planet_ids += [planet['id'] for planet in response['results']]
+                prev        = response['prev']
+                cursor      = response['next']
+
+            self.assertEqual(planet_ids, expected)
+
+            planet_ids = []
+
+            while prev is not None:
+                response   = self.client.get(f'/api/planets?sort={sort}&limit=1&cursor={prev}').json()
+                planet_ids = [planet['id'] for planet in response['results']] + planet_ids
+                prev       = response['prev']
+
+            self.assertEqual(planet_ids, expected[:-1])
+
+    def test_fail_planet_list_view_due_to_cursor_of_other_sort(self):
+        response = self.client.get('/api/planets?sort=new&limit=1&cursor=')
+        response = self.client.get(f'/api/planets?sort=asc&limit=1&cursor={response.json()["next"]}')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {
+                'message' : 'Invalid Cursor'
+            }
+        )
+
+    def test_fail_planet_list_view_due_to_cursor_with_invalid_values(self):
+        cases = [
+            ('id', encode_cursor(['planet_id'], ['abc'], segment=0)),
+            ('id', encode_cursor(['planet_id'], [[1]], segment=0)),
+            ('id', encode_cursor(['planet_id'], [None], segment=0)),
+            ('id', encode_cursor(['planet_id'], {'planet_id' : 1}, segment=0)),
+            ('new', encode_cursor(['-created_at', '-planet_id'], ['yesterday', 1], segment=0)),
+            ('desc', encode_cursor(['-max_price', '-planet_id'], ['NaN', 1], segment=0)),
+            ('asc', encode_cursor(['min_price', 'planet_id'], [{'price' : 1}, 1], segment=1))
+        ]
+
+        for sort, cursor in cases:
+            response = self.client.get(f'/api/planets?sort={sort}&limit=1&cursor={cursor}')
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'message' : 'Invalid Cursor'})
+
+    def test_success_planet_search_document_sync_on_save(self):
+        galaxy      = Galaxy.objects.get(id=2)
+        galaxy.name = '대마젤란'
+        galaxy.save()
+
+        Accomodation.objects.create(
+            id            = 3,
+            name          = '작은방',
+            price         = 100000.00,
+            min_of_people = 1,
+            max_of_people = 2,
+            num_of_bed    = 1,
+            description   = '작아요.',
+            planet_id     = 2
+        )
+
+        document = PlanetSearchDocument.objects.get(planet_id=2)
+
+        self.assertEqual(document.galaxy_name, '대마젤란')
+        self.assertEqual(document.min_price, 100000)
+        self.assertEqual(document.max_price, 200000)
+        self.assertEqual(document.max_of_people, 8)
+        self.assertEqual(
+            document.accomodations,
+            [
+                {
+                    'min_of_people' : 4,
+                    'max_of_people' : 8,
+                    'price' : '200000.00'
+                },
+                {
+                    'min_of_people' : 1,
+                    'max_of_people' : 2,
+                    'price' : '100000.00'
+                }
+            ]
+        )
+
+    def test_success_planet_search_document_delete_on_planet_delete(self):
+        Planet.objects.get(id=2).delete()
+
+        self.assertFalse(PlanetSearchDocument.objects.filter(planet_id=2).exists())
+
+    def test_success_serialize_planets_same_bytes_as_planet_serializer(self):
+        planets = Planet.objects.order_by('-id')
+
+        self.assertEqual(
+            JSONRenderer().render(serialize_planets(planets)),
+            JSONRenderer().render(PlanetSerializer(planets, many=True).data)
+        )
+
+    def test_success_planet_list_view_accomodation_filters_match_same_accomodation(self):
+        Accomodation.objects.create(
+            id            = 3,
+            name          = '작은숙소',
+            price         = 100000.00,
+            min_of_people = 1,
+            max_of_people = 2,
+            num_of_bed    = 1,
+            description   = '작습니다.',
+            planet_id     = 1
+        )
+
+        response = self.client.get('/api/planets?people=4&max-price=1000000')
+
+        self.assertEqual([planet['id'] for planet in response.json()], [2])
+
+        response = self.client.get('/api/planets?people=2&max-price=1000000&sort=desc')
+
+        self.assertEqual([planet['id'] for planet in response.json()], [1, 2])
+
+    def test_success_planet_list_view_price_sort_without_duplicates(self):
+        Accomodation.objects.bulk_create([
+            Accomodation(
+                name          = f'숙소{index}',
+                price         = 100000.00 * index,
+                min_of_people = 1,
+                max_of_people = 8,
+                num_of_bed    = 1,
+                description   = '숙소입니다.',
+                planet_id     = 1
+            ) for index in range(1, 4)
+        ])
+        update_planet_search_documents([1])
+
+        for sort in ('asc', 'desc'):
+            with self.assertNumQueries(1):
+                response = self.client.get(f'/api/planets?sort={sort}&people=2&limit=2')
+
+            self.assertEqual([planet['id'] for planet in response.json()], [1, 2])
+            self.assertEqual(len(response.json()[0]['accomodation_set']), 4)
+
+    def test_success_planet_list_view_with_facets(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/planets?facets=1&limit=1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([planet['id'] for planet in response.json()['results']], [1])
+        self.assertEqual(response.json()['facets'], {
+            'galaxy' : [{'id' : 1, 'name' : '우리은하', 'count' : 1}, {'id' : 2, 'name' : '안드로메다', 'count' : 1}],
+            'theme'  : [{'id' : 1, 'name' : '얼음', 'count' : 1}, {'id' : 2, 'name' : '불', 'count' : 1}],
+            'price'  : [
+                {'min' : 0, 'max' : 100000, 'count' : 0},
+                {'min' : 100000, 'max' : 500000, 'count' : 1},
+                {'min' : 500000, 'max' : 1000000, 'count' : 0},
+                {'min' : 1000000, 'max' : 5000000, 'count' : 1},
+                {'min' : 5000000, 'max' : None, 'count' : 0}
+            ]
+        })
+
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/planets?facets=1&limit=1')
+
+        self.assertEqual(cached.json(), response.json())
+
+    def test_success_planet_list_view_facets_follow_filters(self):
+        response = self.client.get('/api/planets?facets=1&people=5&cursor=')
+
+        self.assertEqual([planet['id'] for planet in response.json()['results']], [2])
+        self.assertEqual(response.json()['facets']['galaxy'], [{'id' : 2, 'name' : '안드로메다', 'count' : 1}])
+        self.assertEqual([bucket['count'] for bucket in response.json()['facets']['price']], [0, 1, 0, 0, 0])
+
+    def test_success_planet_list_view_with_stay_price(self):
+        cases = [
+            ('', {1 : '7500000.00', 2 : '600000.00'}),
+            ('&people=3', {1 : '7750000.00', 2 : '600000.00'}),
+            ('&people=5', {2 : '620000.00'})
+        ]
+
+        for query, stay_prices in cases:
+            with self.assertNumQueries(1):
+                response = self.client.get(f'/api/planets?check-in=2030-03-01&check-out=2030-03-04{query}')
+
+            self.assertEqual({planet['id'] : planet['stay_price'] for planet in response.json()}, stay_prices)
+
+        for accomodation in Accomodation.objects.all():
+            for people in range(1, accomodation.max_of_people+1):
+                booking  = check_validation_request({'accomodation_id' : accomodation.id, 'number_of_adults' : people, 'total_price' : accomodation.price*3})
+                response = self.client.get(f'/api/planets?check-in=2030-03-01&check-out=2030-03-04&people={people}&galaxy={accomodation.planet.galaxy_id}')
+
+                self.assertEqual(response.json()[0]['stay_price'], str(booking['total_price'].quantize(Decimal('0.01'))))
+
+    def test_success_planet_list_view_without_dates_has_no_stay_price(self):
+        response = self.client.get('/api/planets')
+
+        self.assertNotIn('stay_price', response.json()[0])
+
+    def test_success_planet_list_view_cache_hit(self):
+        self.client.get('/api/planets?galaxy=2')
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/planets?galaxy=2')
+
+        self.assertEqual([planet['id'] for planet in response.json()], [2])
+
+    def test_success_planet_list_view_cache_invalidated_by_catalog_change(self):
+        self.client.get('/api/planets?galaxy=2')
+
+        galaxy      = Galaxy.objects.get(id=2)
+        galaxy.name = '대마젤란'
+        galaxy.save()
+
+        response = self.client.get('/api/planets?galaxy=2')
+
+        self.assertEqual(response.json()[0]['galaxy'], {'name' : '대마젤란'})
+
+    def test_success_planet_list_view_cache_invalidated_by_booking(self):
+        response = self.client.get('/api/planets?check-in=2023-06-01&check-out=2023-06-03')
+
+        self.assertEqual([planet['id'] for planet in response.json()], [1, 2])
+
+        f_client = APIClient()
+        f_client.credentials(HTTP_AUTHORIZATION=jwt.encode({'id' : 1, 'exp' : datetime.utcnow() + timedelta(days=2)}, SECRET_KEY, ALGORITHM))
+
+        booking = {
+            'start_date'         : '2023-06-02',
+            'end_date'           : '2023-06-04',
+            'number_of_adults'   : 4,
+            'number_of_children' : 0,
+            'user_request'       : '테스트',
+            'total_price'        : 400000,
+            'planet_id'          : 2,
+            'accomodation_id'    : 2
+        }
+
+        response = f_client.post('/api/bookings', json.dumps(booking), content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get('/api/planets?check-in=2023-06-01&check-out=2023-06-03')
+
+        self.assertEqual([planet['id'] for planet in response.json()], [1])
+
     def test_fail_planetlistview_get_invalid_date(self):
         response = self.client.get('/api/planets?check-in=2022-03-19&check-out=2022-03-18')
         
@@ -324,6 +704,20 @@ class PlanetListTest(APITestCase):
             }
         )
 
+    def test_fail_planetlistview_get_too_long_date_range(self):
+        check_out = date(2030, 3, 1) + timedelta(days=MAX_SEARCH_NIGHTS+1)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/planets?check-in=2030-03-01&check-out={check_out.isoformat()}')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'Invalid Date'})
+
+        response = self.client.get('/api/planets?check-in=1000-01-01&check-out=9999-01-01')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f'/api/planets?check-in=2030-03-01&check-out={(check_out - timedelta(days=1)).isoformat()}').status_code, 200)
+
 class PlanetDetailTest(APITestCase):
     maxDiff = None
 
@@ -532,4 +926,454 @@ class PlanetDetailTest(APITestCase):
             {
                 'message' : 'Invalid Accomodation'
             }
-        )
\ No newline at end of file
+        )
+
+    def test_success_detail_serializer_uses_given_booked_intervals(self):
+        accomodation = Accomodation.objects.get(id=1)
+
+        Booking.objects.filter(id=2).update(start_date=date.today() + timedelta(days=10), end_date=date.today() + timedelta(days=12))
+
+        booked_intervals = get_booked_intervals(accomodation)
+
+        with self.assertNumQueries(0):
+            invalid_dates = PlanetDetailSerializer(context={'booked_intervals' : booked_intervals}).get_invalid_dates(accomodation)
+
+        self.assertEqual(invalid_dates, [(date.today() + timedelta(days=days)).strftime('%Y-%m-%d') for days in (10, 11)])
+        self.assertEqual(invalid_dates, PlanetDetailSerializer().get_invalid_dates(accomodation))
+        self.assertEqual(PlanetDetailSerializer(context={'booked_intervals' : []}).get_invalid_dates(accomodation), [])
+
+    def test_success_accomodation_view_not_modified_with_etag(self):
+        response = self.client.get('/api/planets/1/accomodation/1?check-in=&check-out=')
+        etag     = response['ETag']
+
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/planets/1/accomodation/1?check-in=&check-out=', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_success_accomodation_view_etag_changes_with_query(self):
+        response = self.client.get('/api/planets/1/accomodation/1?check-in=&check-out=')
+        etag     = response['ETag']
+
+        response = self.client.get('/api/planets/1/accomodation/1?check-in=2030-03-01&check-out=2030-03-05', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_success_accomodation_view_etag_changes_with_image(self):
+        etag = self.client.get('/api/planets/1/accomodation/1?check-in=&check-out=')['ETag']
+
+        AccomodationImage.objects.filter(id=1).delete()
+
+        response = self.client.get('/api/planets/1/accomodation/1?check-in=&check-out=', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['accomodationimage_set'], [])
+
+    def test_success_accomodation_view_etag_changes_with_booking(self):
+        etag = self.client.get('/api/planets/1/accomodation/1?check-in=&check-out=')['ETag']
+
+        f_client = APIClient()
+        f_client.credentials(HTTP_AUTHORIZATION=jwt.encode({'id' : self.user.id, 'exp' : datetime.utcnow() + timedelta(days=2)}, SECRET_KEY, ALGORITHM))
+
+        booking = {
+            'start_date'         : '2030-03-01',
+            'end_date'           : '2030-03-03',
+            'number_of_adults'   : 2,
+            'number_of_children' : 0,
+            'user_request'       : '테스트',
+            'total_price'        : 5000000,
+            'planet_id'          : 1,
+            'accomodation_id'    : 1
+        }
+
+        self.assertEqual(f_client.post('/api/bookings', json.dumps(booking), content_type='application/json').status_code, 201)
+
+        response = self.client.get('/api/planets/1/accomodation/1?check-in=&check-out=', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+
+class AvailabilityTest(SimpleTestCase):
+    '''
+    무작위 예약/숙박 기간에 대해 기존 하루 단위 문자열 비교와 같은 결과인지 확인한다.
+    '''
+    EXAMPLES = 300
+    BASE     = date(2030, 1, 1)
+
+    def get_random_bookings(self, rand):
+        bookings = []
+
+        for _ in range(rand.randint(0, 8)):
+            start_date = self.BASE + timedelta(days=rand.randint(0, 60))
+            bookings.append((start_date, start_date + timedelta(days=rand.randint(0, 10))))
+
+        return bookings
+
+    def get_naive_invalid_dates(self, bookings):
+        invalid_dates = []
+
+        for start_date, end_date in bookings:
+            invalid_dates += [datetime.strftime(start_date+timedelta(days=stay), "%Y-%m-%d") for stay in range((end_date - start_date).days)]
+
+        return invalid_dates
+
+    def test_merge_intervals_matches_day_expansion(self):
+        rand = random.Random(12)
+
+        for _ in range(self.EXAMPLES):
+            bookings  = self.get_random_bookings(rand)
+            intervals = merge_intervals(bookings)
+
+            self.assertEqual(expand_intervals(intervals), sorted(set(self.get_naive_invalid_dates(bookings))))
+            self.assertEqual(intervals, compress_dates(date.fromisoformat(night) for night in expand_intervals(intervals)))
+
+            for (_, prev_end), (next_start, _) in zip(intervals, intervals[1:]):
+                self.assertLess(prev_end, next_start)
+
+    def test_has_overlap_matches_day_comparison(self):
+        rand = random.Random(34)
+
+        for _ in range(self.EXAMPLES):
+            bookings      = self.get_random_bookings(rand)
+            intervals     = merge_intervals(bookings)
+            invalid_dates = self.get_naive_invalid_dates(bookings)
+
+            check_in  = self.BASE + timedelta(days=rand.randint(-5, 75))
+            check_out = check_in + timedelta(days=rand.randint(-2, 12))
+            hope_date = [datetime.strftime(check_in+timedelta(days=stay), "%Y-%m-%d") for stay in range((check_out - check_in).days)]
+            expected  = any(night in invalid_dates for night in hope_date)
+
+            self.assertEqual(has_overlap(intervals, check_in, check_out), expected)
+
+    def test_find_free_window_matches_day_scan(self):
+        rand = random.Random(90)
+
+        for _ in range(self.EXAMPLES):
+            bookings = self.get_random_bookings(rand)
+            start    = self.BASE + timedelta(days=rand.randint(0, 30))
+            end      = start + timedelta(days=rand.randint(0, 40))
+            nights   = rand.randint(1, 10)
+            expected = None
+
+            for day in range((end - start).days - nights + 1):
+                check_in = start + timedelta(days=day)
+
+                if not any(booked_start < check_in + timedelta(days=nights) and booked_end > max(check_in, booked_start) for booked_start, booked_end in bookings):
+                    expected = (check_in, check_in + timedelta(days=nights))
+                    break
+
+            self.assertEqual(find_free_window(merge_intervals(bookings), start, end, nights), expected)
+
+    def test_check_valid_date_with_and_without_intervals(self):
+        rand = random.Random(56)
+
+        for _ in range(self.EXAMPLES):
+            bookings  = self.get_random_bookings(rand)
+            check_in  = self.BASE + timedelta(days=rand.randint(-5, 75))
+            check_out = check_in + timedelta(days=rand.randint(1, 12))
+            results   = []
+
+            for intervals in (merge_intervals(bookings), None):
+                data = {'price' : '100.00', 'invalid_dates' : self.get_naive_invalid_dates(bookings)}
+
+                try:
+                    results.append(check_valid_date(check_in.isoformat(), check_out.isoformat(), data, intervals))
+                except ValidationError:
+                    results.append('Invalid Date')
+
+            self.assertEqual(results[0], results[1])
+
+class AccomodationCalendarTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client = APIClient()
+        cls.month  = add_months(date.today().replace(day=1), 1)
+
+        user = User.objects.create(id=1, name='testman', email='test@test.com', kakao_id=12345678911)
+
+        PlanetTheme.objects.create(id=1, name='불')
+        Galaxy.objects.create(id=1, name='우리은하')
+        Planet.objects.create(id=1, name='이쁜행성', thumbnail='testurl/testurl/test', theme_id=1, galaxy_id=1)
+        BookingStatus.objects.create(id=1, status='예약중')
+
+        Accomodation.objects.bulk_create([
+            Accomodation(
+                id            = accomodation_id,
+                name          = f'이쁜숙소{accomodation_id}',
+                price         = 2500000.00 * accomodation_id,
+                min_of_people = 2,
+                max_of_people = 4,
+                num_of_bed    = 2,
+                description   = '엄청 이쁜 숙소입니다.',
+                planet_id     = 1
+            ) for accomodation_id in range(1, 4)
+        ])
+
+        update_planet_search_documents([1])
+
+        stays = [
+            (cls.month - timedelta(days=2), cls.month + timedelta(days=3)),
+            (cls.month + timedelta(days=3), cls.month + timedelta(days=5)),
+            (cls.month + timedelta(days=10), cls.month + timedelta(days=12)),
+            (add_months(cls.month, 1) - timedelta(days=1), add_months(cls.month, 1) + timedelta(days=2))
+        ]
+
+        Booking.objects.bulk_create([
+            Booking(
+                booking_number     = uuid4(),
+                start_date         = start_date,
+                end_date           = end_date,
+                price              = 5000000,
+                number_of_adults   = 2,
+                number_of_children = 0,
+                user_request       = '',
+                user               = user,
+                booking_status_id  = 1,
+                planet_id          = 1,
+                accomodation_id    = 1
+            ) for start_date, end_date in stays
+        ])
+
+        Booking.objects.create(
+            booking_number     = uuid4(),
+            start_date         = cls.month + timedelta(days=1),
+            end_date           = cls.month + timedelta(days=4),
+            price              = 5000000,
+            number_of_adults   = 2,
+            number_of_children = 0,
+            user_request       = '',
+            user               = user,
+            booking_status_id  = 1,
+            planet_id          = 1,
+            accomodation_id    = 2
+        )
+
+    def tearDown(self):
+        caches[HOLD_CACHE_ALIAS].clear()
+
+    def test_success_calendar_merges_and_clips_ranges(self):
+        next_month = add_months(self.month, 1)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/planets/1/accomodation/1/calendar?month={self.month.strftime("%Y-%m")}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'start'   : self.month.isoformat(),
+            'end'     : next_month.isoformat(),
+            'blocked' : [
+                [self.month.isoformat(), (self.month + timedelta(days=5)).isoformat()],
+                [(self.month + timedelta(days=10)).isoformat(), (self.month + timedelta(days=12)).isoformat()],
+                [(next_month - timedelta(days=1)).isoformat(), next_month.isoformat()]
+            ],
+            'next'    : next_month.strftime("%Y-%m")
+        })
+
+    def test_success_calendar_pages_by_month(self):
+        first  = self.client.get(f'/api/planets/1/accomodation/1/calendar?month={self.month.strftime("%Y-%m")}').json()
+        second = self.client.get(f'/api/planets/1/accomodation/1/calendar?month={first["next"]}').json()
+        both   = self.client.get(f'/api/planets/1/accomodation/1/calendar?month={self.month.strftime("%Y-%m")}&months=2').json()
+
+        self.assertEqual(second['start'], first['end'])
+        self.assertEqual(second['blocked'][0], [first['end'], (add_months(self.month, 1) + timedelta(days=2)).isoformat()])
+        self.assertEqual(both['blocked'][:2], first['blocked'][:2])
+        self.assertEqual(both['blocked'][2], [first['blocked'][2][0], second['blocked'][0][1]])
+        self.assertEqual(both['next'], second['next'])
+
+    def test_success_calendar_ends_at_horizon(self):
+        last_month = add_months(date.today().replace(day=1), 23).strftime("%Y-%m")
+        response   = self.client.get(f'/api/planets/1/accomodation/1/calendar?month={last_month}&months=6')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['next'], None)
+        self.assertEqual(response.json()['blocked'], [])
+
+    def test_fail_calendar_due_to_invalid_month(self):
+        past_month = add_months(date.today().replace(day=1), -1).strftime("%Y-%m")
+
+        for query in ['month=2030-13', f'month={past_month}', 'months=7', 'months=0', 'months=a']:
+            response = self.client.get(f'/api/planets/1/accomodation/1/calendar?{query}')
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'message' : 'Invalid Month'})
+
+    def test_fail_calendar_due_to_invalid_accomodation(self):
+        response = self.client.get('/api/planets/2/accomodation/1/calendar')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'Invalid Accomodation'})
+
+    def test_success_planet_availability_for_all_accomodations(self):
+        calendar = self.client.get(f'/api/planets/1/accomodation/1/calendar?month={self.month.strftime("%Y-%m")}').json()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/planets/1/availability?month={self.month.strftime("%Y-%m")}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'start'         : calendar['start'],
+            'end'           : calendar['end'],
+            'accomodations' : [
+                {'id' : 1, 'name' : '이쁜숙소1', 'blocked' : calendar['blocked']},
+                {'id' : 2, 'name' : '이쁜숙소2', 'blocked' : [[(self.month + timedelta(days=1)).isoformat(), (self.month + timedelta(days=4)).isoformat()]]},
+                {'id' : 3, 'name' : '이쁜숙소3', 'blocked' : []}
+            ],
+            'next'          : calendar['next']
+        })
+
+    def test_fail_planet_availability_due_to_invalid_planet(self):
+        response = self.client.get('/api/planets/2/availability')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'Invalid Planet'})
+
+    def test_success_availability_batch(self):
+        checks = [
+            {'accomodation_id' : 1, 'check_in' : (self.month + timedelta(days=5)).isoformat(), 'check_out' : (self.month + timedelta(days=10)).isoformat()},
+            {'accomodation_id' : 1, 'check_in' : (self.month + timedelta(days=4)).isoformat(), 'check_out' : (self.month + timedelta(days=6)).isoformat()},
+            {'accomodation_id' : 2, 'check_in' : (self.month + timedelta(days=5)).isoformat(), 'check_out' : (self.month + timedelta(days=10)).isoformat()},
+            {'accomodation_id' : 2, 'check_in' : self.month.isoformat(), 'check_out' : (self.month + timedelta(days=2)).isoformat()},
+            {'accomodation_id' : 3, 'check_in' : self.month.isoformat(), 'check_out' : (self.month + timedelta(days=2)).isoformat()}
+        ]
+
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/planets/availability', json.dumps({'checks' : checks}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'results' : [dict(check, available=available) for check, available in zip(checks, [True, False, True, False, True])]})
+
+    def test_success_availability_batch_matches_overlap_query(self):
+        rand   = random.Random(78)
+        checks = []
+
+        for _ in range(MAX_AVAILABILITY_BATCH_SIZE):
+            check_in = self.month + timedelta(days=rand.randint(-5, 40))
+            checks.append({'accomodation_id' : rand.randint(1, 3), 'check_in' : check_in.isoformat(), 'check_out' : (check_in + timedelta(days=rand.randint(1, 7))).isoformat()})
+
+        response = self.client.post('/api/planets/availability', json.dumps({'checks' : checks}), content_type='application/json')
+
+        for check, result in zip(checks, response.json()['results']):
+            booked = Booking.objects.filter(accomodation_id=check['accomodation_id'], start_date__lt=check['check_out'], end_date__gt=check['check_in']).exists()
+
+            self.assertEqual(result['available'], not booked)
+
+    def test_fail_availability_batch(self):
+        check = {'accomodation_id' : 1, 'check_in' : self.month.isoformat(), 'check_out' : (self.month + timedelta(days=1)).isoformat()}
+
+        cases = [
+            ({'checks' : [check] * (MAX_AVAILABILITY_BATCH_SIZE + 1)}, 'Too Many Checks'),
+            ({'checks' : []}, 'Invalid Request'),
+            ([check], 'Invalid Request'),
+            ({'checks' : [dict(check, check_in='2030-02-30')]}, 'Invalid Request'),
+            ({'checks' : [dict(check, check_out=check['check_in'])]}, 'Invalid Date'),
+            ({'checks' : [check, dict(check, accomodation_id=4)]}, 'Invalid Accomodation')
+        ]
+
+        for body, message in cases:
+            response = self.client.post('/api/planets/availability', json.dumps(body), content_type='application/json')
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'message' : message})
+
+    def test_success_flexible_search_returns_earliest_free_window(self):
+        month = self.month.strftime("%Y-%m")
+        cases = [
+            ('nights=5', (0, 5)),
+            ('nights=5&max-price=5000000', (4, 9)),
+            ('nights=6&max-price=5000000', (4, 10)),
+            ('nights=5&max-price=2500000', (5, 10)),
+            ('nights=6&max-price=2500000', (12, 18))
+        ]
+
+        for query, (check_in, check_out) in cases:
+            response = self.client.get(f'/api/planets?month={month}&{query}')
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([planet['id'] for planet in response.json()], [1])
+            self.assertEqual(response.json()[0]['free_window'], {
+                'check_in'  : (self.month + timedelta(days=check_in)).isoformat(),
+                'check_out' : (self.month + timedelta(days=check_out)).isoformat()
+            })
+
+    def test_success_flexible_search_prices_only_free_accomodations(self):
+        response = self.client.get(f'/api/planets?month={self.month.strftime("%Y-%m")}&nights=20&max-price=5000000')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['stay_price'], '100000000.00')
+
+    def test_success_flexible_search_without_free_window(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/planets?month={self.month.strftime("%Y-%m")}&nights=20&max-price=2500000')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+    def test_fail_flexible_search(self):
+        past_month = add_months(date.today().replace(day=1), -1).strftime("%Y-%m")
+        cases      = [
+            (f'month={past_month}&nights=3', 'Invalid Month'),
+            ('nights=3', 'Invalid Month'),
+            (f'month={self.month.strftime("%Y-%m")}&nights=0', 'Invalid Nights'),
+            (f'month={self.month.strftime("%Y-%m")}&nights=29', 'Invalid Nights'),
+            (f'month={self.month.strftime("%Y-%m")}&nights=a', 'Invalid Nights'),
+            (f'month={add_months(date.today().replace(day=1), 24).strftime("%Y-%m")}&nights=3', 'Invalid Month'),
+            ('month=9999-12&nights=3', 'Invalid Month')
+        ]
+
+        for query, message in cases:
+            response = self.client.get(f'/api/planets?{query}')
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'message' : message})
+
+    def test_success_availability_ignores_cancelled_bookings(self):
+        Booking.objects.filter(accomodation_id=2).update(booking_status_id=4)
+
+        month    = self.month.strftime("%Y-%m")
+        check    = {'accomodation_id' : 2, 'check_in' : self.month.isoformat(), 'check_out' : (self.month + timedelta(days=5)).isoformat()}
+        calendar = self.client.get(f'/api/planets/1/accomodation/2/calendar?month={month}').json()
+        planet   = self.client.get(f'/api/planets/1/availability?month={month}').json()
+        batch    = self.client.post('/api/planets/availability', json.dumps({'checks' : [check]}), content_type='application/json').json()
+
+        self.assertEqual(calendar['blocked'], [])
+        self.assertEqual(planet['accomodations'][1]['blocked'], [])
+        self.assertEqual(batch['results'][0]['available'], True)
+
+    def test_success_availability_treats_holds_as_blocked(self):
+        HoldStore().acquire(1, 3, self.month + timedelta(days=5), self.month + timedelta(days=7))
+
+        month    = self.month.strftime("%Y-%m")
+        blocked  = [[(self.month + timedelta(days=5)).isoformat(), (self.month + timedelta(days=7)).isoformat()]]
+        check    = {'accomodation_id' : 3, 'check_in' : (self.month + timedelta(days=6)).isoformat(), 'check_out' : (self.month + timedelta(days=8)).isoformat()}
+        calendar = self.client.get(f'/api/planets/1/accomodation/3/calendar?month={month}').json()
+        planet   = self.client.get(f'/api/planets/1/availability?month={month}').json()
+        batch    = self.client.post('/api/planets/availability', json.dumps({'checks' : [check]}), content_type='application/json').json()
+        detail   = self.client.get(f'/api/planets/1/accomodation/3?check-in={check["check_in"]}&check-out={check["check_out"]}')
+
+        self.assertEqual(calendar['blocked'], blocked)
+        self.assertEqual(planet['accomodations'][2]['blocked'], blocked)
+        self.assertEqual(batch['results'][0]['available'], False)
+        self.assertEqual(detail.status_code, 400)
+        self.assertEqual(detail.json(), {'message' : 'Invalid Date'})
+
+    def test_success_detail_does_not_block_own_hold(self):
+        HoldStore().acquire(1, 3, self.month + timedelta(days=5), self.month + timedelta(days=7))
+
+        url   = f'/api/planets/1/accomodation/3?check-in={(self.month + timedelta(days=5)).isoformat()}&check-out={(self.month + timedelta(days=7)).isoformat()}'
+        token = jwt.encode({'id' : 1, 'exp' : datetime.utcnow() + timedelta(days=2)}, SECRET_KEY, ALGORITHM)
+
+        owner_client = APIClient()
+        owner_client.credentials(HTTP_AUTHORIZATION=token)
+
+        response = owner_client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['stays'], 2)
+
+        anonymous = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(anonymous.status_code, 400)
+        self.assertEqual(anonymous.json(), {'message' : 'Invalid Date'})
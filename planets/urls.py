@@ -1,8 +1,11 @@
 from django.urls import path
 
-from planets.views import PlanetsView, PlanetDetailView
+from planets.views import PlanetsView, PlanetDetailView, AccomodationCalendarView, PlanetAvailabilityView, AvailabilityBatchView
 
 urlpatterns = [
     path('', PlanetsView.as_view()),
-    path('/<int:planet_id>/accomodation/<int:accomodation_id>', PlanetDetailView.as_view())
+    path('/availability', AvailabilityBatchView.as_view()),
+    path('/<int:planet_id>/accomodation/<int:accomodation_id>', PlanetDetailView.as_view()),
+    path('/<int:planet_id>/accomodation/<int:accomodation_id>/calendar', AccomodationCalendarView.as_view()),
+    path('/<int:planet_id>/availability', PlanetAvailabilityView.as_view())
 ]
\ No newline at end of file
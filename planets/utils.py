@@ -1,16 +1,46 @@
-from datetime import datetime, timedelta
+import time
+import hashlib
+from decimal import Decimal
+from datetime import date, datetime, timedelta
 
+from django.db import transaction
+from django.db.models import Q, F, Value, Prefetch, Count, Max, FilteredRelation, Case, When, IntegerField, DecimalField, ExpressionWrapper, OuterRef, Subquery
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 
-def check_valid_date(check_in, check_out, serializer_data):
+from bookings.holds import hold_store
+from bookings.utils import SURCHARGE_RATE
+from bookings.models import BookingStatusEnum
+
+from .availability import merge_intervals, has_overlap, compress_dates, add_months, find_free_window
+from .models import Planet, PlanetImage, PlanetNameGram, Accomodation, PlanetSearchDocument
+from .serializers import PlanetSerializer
+
+def get_window_booking_relation(start, end):
+    '''
+    숙소에 [start, end) 와 겹치는, 취소되지 않은 예약만 LEFT JOIN 한다.
+    '''
+    return FilteredRelation('booking', condition=Q(booking__start_date__lt=end, booking__end_date__gt=start)
+                                                 & ~Q(booking__booking_status_id=BookingStatusEnum.CANCELLED.value))
+
+def check_valid_date(check_in, check_out, serializer_data, booked_intervals=None, accomodation_id=None, user_id=None):
+    '''
+    booked_intervals : merge_intervals 결과. 없으면 serializer_data의 invalid_dates로 만든다.
+    accomodation_id  : 있으면 user_id 가 아닌 사용자의 결제 중인 hold 도 막힌 날짜로 본다.
+    '''
     if check_in and check_out:    
-        check_in              = datetime.strptime(check_in,"%Y-%m-%d")
-        check_out             = datetime.strptime(check_out, "%Y-%m-%d")
-        stays                 = (check_out - check_in).days
-        hope_date             = [datetime.strftime(check_in+timedelta(days=stay), "%Y-%m-%d") for stay in range(stays)]    
-        date_invalidity_check = [date for date in hope_date if date in serializer_data.get('invalid_dates')]
-        
-        if date_invalidity_check:
+        check_in  = datetime.strptime(check_in,"%Y-%m-%d").date()
+        check_out = datetime.strptime(check_out, "%Y-%m-%d").date()
+        stays     = (check_out - check_in).days
+
+        if booked_intervals is None:
+            booked_intervals = compress_dates(date.fromisoformat(invalid_date) for invalid_date in serializer_data.get('invalid_dates'))
+
+        if accomodation_id is not None:
+            held_nights      = hold_store.get_held_nights([(accomodation_id, check_in, check_out)], user_id)[accomodation_id]
+            booked_intervals = merge_intervals(list(booked_intervals) + compress_dates(held_nights))
+
+        if has_overlap(booked_intervals, check_in, check_out):
             raise ValidationError("Invalid Date")
 
         serializer_data['stays'] = stays
@@ -20,4 +50,371 @@ def check_valid_date(check_in, check_out, serializer_data):
         serializer_data['stays'] = None
         serializer_data['price'] = None
         
-    return serializer_data
\ No newline at end of file
+    return serializer_data
+
+def update_planet_search_documents(planet_ids):
+    planets = Planet.objects.filter(id__in=planet_ids)\
+                            .select_related('galaxy', 'theme')\
+                            .prefetch_related(Prefetch('planetimage_set', queryset=PlanetImage.objects.order_by('id')),
+                                              Prefetch('accomodation_set', queryset=Accomodation.objects.order_by('id')))
+
+    documents = []
+
+    for planet in planets:
+        data          = PlanetSerializer(planet).data
+        accomodations = planet.accomodation_set.all()
+
+        documents.append(PlanetSearchDocument(
+            planet_id     = planet.id,
+            name          = planet.name,
+            thumbnail     = planet.thumbnail,
+            galaxy_id     = planet.galaxy_id,
+            galaxy_name   = data['galaxy']['name'],
+            theme_id      = planet.theme_id,
+            theme_name    = data['theme']['name'],
+            image_urls    = [image['image_url'] for image in data['planetimage_set']],
+            accomodations = data['accomodation_set'],
+            min_price     = min([accomodation.price for accomodation in accomodations], default=None),
+            max_price     = max([accomodation.price for accomodation in accomodations], default=None),
+            max_of_people = max([accomodation.max_of_people for accomodation in accomodations], default=None),
+            created_at    = planet.created_at
+        ))
+
+    PlanetSearchDocument.objects.filter(planet_id__in=planet_ids).delete()
+    PlanetSearchDocument.objects.bulk_create(documents)
+
+    bump_catalog_generation()
+
+NAME_GRAM_SIZE = 3
+
+def get_name_grams(name, sizes=range(1, NAME_GRAM_SIZE+1)):
+    name = name.lower()
+
+    return {name[start:start+size] for size in sizes for start in range(len(name)-size+1)}
+
+def update_planet_name_grams(planet_ids):
+    planets = Planet.objects.filter(id__in=planet_ids).only('id', 'name')
+
+    PlanetNameGram.objects.filter(planet_id__in=planet_ids).delete()
+    PlanetNameGram.objects.bulk_create([
+        PlanetNameGram(gram=gram, planet_id=planet.id) for planet in planets for gram in get_name_grams(planet.name)
+    ])
+
+    bump_catalog_generation()
+
+def search_planet_ids(searching):
+    '''
+    3글자 이하는 n-gram 하나로 바로 찾고, 더 긴 검색어는 모든 3-gram을 가진 행성을 후보로 돌려준다.
+    (후보는 name__icontains로 한 번 더 걸러야 한다)
+    '''
+    searching = searching.lower()
+
+    if len(searching) <= NAME_GRAM_SIZE:
+        return PlanetNameGram.objects.filter(gram=searching).values('planet_id')
+
+    grams = get_name_grams(searching, sizes=[NAME_GRAM_SIZE])
+
+    return PlanetNameGram.objects.filter(gram__in=grams)\
+                                 .values('planet_id')\
+                                 .annotate(num_of_grams=Count('gram', distinct=True))\
+                                 .filter(num_of_grams=len(grams))\
+                                 .values('planet_id')
+
+PLANET_SEARCH_CACHE_TIMEOUT = 60*5
+PLANET_SEARCH_PARAMS        = ('galaxy', 'theme', 'searching', 'people', 'min-price', 'max-price', 'check-in', 'check-out', 'month', 'nights', 'sort', 'limit', 'offset', 'cursor', 'facets')
+CATALOG_GENERATION_KEY      = 'planets:generation:catalog'
+MAX_SEARCH_NIGHTS           = 90
+
+def get_night_generation_key(night):
+    return f'planets:generation:night:{night.isoformat()}'
+
+def get_accomodation_generation_key(accomodation_id):
+    return f'planets:generation:accomodation:{accomodation_id}'
+
+def get_generations(keys):
+    '''
+    캐시에서 세대가 지워지면 0이 아닌 현재 시각으로 다시 시작해서 예전 세대의 응답과 겹치지 않게 한다.
+    '''
+    generations = cache.get_many(keys)
+
+    for key in keys:
+        if key not in generations:
+            cache.add(key, time.time_ns())
+            generations[key] = cache.get(key)
+
+    return [generations[key] for key in keys]
+
+def bump_generations(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+
+        except ValueError:
+            cache.add(key, time.time_ns())
+
+def bump_generations_on_commit(keys):
+    '''
+    지금 한 번, 커밋 후 한 번 더 올린다. 커밋 전에 읽은 세대로 저장된 응답이 남지 않도록.
+    '''
+    bump_generations(keys)
+    transaction.on_commit(lambda : bump_generations(keys))
+
+def bump_catalog_generation():
+    bump_generations_on_commit([CATALOG_GENERATION_KEY])
+
+def bump_booking_generations(accomodation_id, start_date, end_date):
+    nights = [start_date+timedelta(days=stay) for stay in range((end_date - start_date).days)]
+
+    bump_generations_on_commit([get_accomodation_generation_key(accomodation_id)] + [get_night_generation_key(night) for night in nights])
+
+def get_planet_search_cache_key(params, check_in, check_out):
+    '''
+    check_in, check_out 이 있으면 그 사이 밤들의 세대도 키에 들어간다. (최대 MAX_SEARCH_NIGHTS 개)
+    '''
+    generation_keys = [CATALOG_GENERATION_KEY]
+
+    if check_in and check_out:
+        generation_keys += [get_night_generation_key(check_in+timedelta(days=stay)) for stay in range((check_out - check_in).days)]
+
+    normalized_params = sorted((key, value.strip()) for key, value in params.items() if key in PLANET_SEARCH_PARAMS)
+    raw_key           = repr((normalized_params, check_in, check_out, get_generations(generation_keys)))
+
+    return 'planets:search:' + hashlib.md5(raw_key.encode('utf-8')).hexdigest()
+
+def get_accomodation_etag(planet_id, accomodation_id, params, user_id=None):
+    '''
+    숙소, 숙소 이미지의 updated_at과 이미지 수, 예약 세대, 오늘 날짜(invalid_dates 기간), check-in/out, 요청한 사용자(내 hold 는 막히지 않는다)로 만든 버전.
+    숙소가 없으면 None
+    '''
+    version = Accomodation.objects.filter(id=accomodation_id, planet_id=planet_id)\
+                                  .annotate(images_updated_at=Max('accomodationimage__updated_at'),
+                                            num_of_images=Count('accomodationimage'))\
+                                  .values_list('updated_at', 'images_updated_at', 'num_of_images')\
+                                  .first()
+
+    if version is None:
+        return None
+
+    booking_generations = get_generations([get_accomodation_generation_key(accomodation_id)])
+    raw_etag            = repr((version, booking_generations, date.today().isoformat(), params.get('check-in'), params.get('check-out'), user_id))
+
+    return '"' + hashlib.md5(raw_etag.encode('utf-8')).hexdigest() + '"'
+
+CALENDAR_HORIZON_MONTHS  = 24
+CALENDAR_MAX_PAGE_MONTHS = 6
+
+def get_calendar_window(month, months, today=None):
+    '''
+    month  : "%Y-%m", 없으면 이번 달
+    months : 한 페이지에 담을 개월 수(1 ~ CALENDAR_MAX_PAGE_MONTHS)
+    이번 달부터 CALENDAR_HORIZON_MONTHS 개월 안쪽만 조회할 수 있다. (start, end, next_month) 반환
+    '''
+    first_month = (today or date.today()).replace(day=1)
+    horizon     = add_months(first_month, CALENDAR_HORIZON_MONTHS)
+
+    try:
+        start  = datetime.strptime(month, "%Y-%m").date() if month else first_month
+        months = int(months or 1)
+
+    except ValueError:
+        raise ValidationError('Invalid Month')
+
+    if not first_month <= start < horizon or not 1 <= months <= CALENDAR_MAX_PAGE_MONTHS:
+        raise ValidationError('Invalid Month')
+
+    end = min(add_months(start, months), horizon)
+
+    return start, end, end.strftime("%Y-%m") if end < horizon else None
+
+MAX_AVAILABILITY_BATCH_SIZE = 100
+
+def parse_availability_checks(checks):
+    '''
+    checks : [{'accomodation_id', 'check_in', 'check_out'}, ...] 최대 MAX_AVAILABILITY_BATCH_SIZE 개
+    '''
+    if not isinstance(checks, list) or not checks:
+        raise ValidationError('Invalid Request')
+
+    if len(checks) > MAX_AVAILABILITY_BATCH_SIZE:
+        raise ValidationError('Too Many Checks')
+
+    try:
+        parsed_checks = [(int(check['accomodation_id']),
+                          datetime.strptime(check['check_in'], "%Y-%m-%d").date(),
+                          datetime.strptime(check['check_out'], "%Y-%m-%d").date()) for check in checks]
+
+    except (KeyError, TypeError, ValueError):
+        raise ValidationError('Invalid Request')
+
+    if any(check_in >= check_out for _, check_in, check_out in parsed_checks):
+        raise ValidationError('Invalid Date')
+
+    return parsed_checks
+
+def check_availability_batch(checks):
+    '''
+    checks : parse_availability_checks 결과
+    전체 기간 안의 예약을 숙소에 LEFT JOIN 해서 한 번에 가져온 뒤, 숙소별로 합친 구간에 bisect로 겹침을 확인한다. 결제 중인 hold 도 막힌 날짜로 본다.
+    없는 숙소가 있으면 Accomodation.DoesNotExist
+    '''
+    accomodation_ids = {accomodation_id for accomodation_id, _, _ in checks}
+    window_start     = min(check_in for _, check_in, _ in checks)
+    window_end       = max(check_out for _, _, check_out in checks)
+
+    rows = Accomodation.objects.filter(id__in=accomodation_ids)\
+                               .annotate(window_booking=get_window_booking_relation(window_start, window_end))\
+                               .values_list('id', 'window_booking__start_date', 'window_booking__end_date')
+
+    bookings = {accomodation_id : [] for accomodation_id in accomodation_ids}
+    found    = set()
+
+    for accomodation_id, start_date, end_date in rows:
+        found.add(accomodation_id)
+
+        if start_date:
+            bookings[accomodation_id].append((start_date, end_date))
+
+    if found != accomodation_ids:
+        raise Accomodation.DoesNotExist
+
+    for accomodation_id, held_nights in hold_store.get_held_nights(checks).items():
+        bookings[accomodation_id] += compress_dates(held_nights)
+
+    intervals = {accomodation_id : merge_intervals(booked) for accomodation_id, booked in bookings.items()}
+
+    return [not has_overlap(intervals[accomodation_id], check_in, check_out) for accomodation_id, check_in, check_out in checks]
+
+MAX_FLEXIBLE_NIGHTS = 28
+
+def get_flexible_window(month, nights, today=None):
+    '''
+    month : "%Y-%m" (이번 달부터 CALENDAR_HORIZON_MONTHS 개월 안쪽), nights : 1 ~ MAX_FLEXIBLE_NIGHTS
+    그 달 안에서 묵을 수 있는 기간 (check_in, check_out, nights). 이번 달이면 오늘부터
+    '''
+    today       = today or date.today()
+    first_month = today.replace(day=1)
+
+    try:
+        start = datetime.strptime(month or '', "%Y-%m").date()
+
+    except ValueError:
+        raise ValidationError('Invalid Month')
+
+    try:
+        nights = int(nights)
+
+    except ValueError:
+        raise ValidationError('Invalid Nights')
+
+    # 기간 밖의 달(9999-12 등)은 add_months 전에 막는다.
+    if not first_month <= start < add_months(first_month, CALENDAR_HORIZON_MONTHS):
+        raise ValidationError('Invalid Month')
+
+    if not 1 <= nights <= MAX_FLEXIBLE_NIGHTS:
+        raise ValidationError('Invalid Nights')
+
+    return max(start, today), add_months(start, 1), nights
+
+def find_planet_free_windows(planet_ids, check_in, check_out, nights, people=None, min_price=None, max_price=None):
+    '''
+    planet_ids : 행성 id 쿼리셋(서브쿼리로 사용)
+    조건에 맞는 숙소에 [check_in, check_out) 안의 예약을 LEFT JOIN 해서 한 번에 가져온 뒤,
+    행성별로 가장 이른 nights박 빈 기간을 찾는다.
+    ({planet_id : (check_in, check_out)}, nights박 빈 기간이 있는 숙소 id 리스트) 반환
+    '''
+    filter_set = {
+        'max_of_people__gte' : people,
+        'price__gte'         : min_price,
+        'price__lte'         : max_price
+    }
+
+    rows = Accomodation.objects.filter(planet_id__in=planet_ids, **{key : value for key, value in filter_set.items() if value})\
+                               .annotate(window_booking=get_window_booking_relation(check_in, check_out))\
+                               .order_by('planet_id', 'id')\
+                               .values_list('planet_id', 'id', 'window_booking__start_date', 'window_booking__end_date')
+
+    bookings = {}
+
+    for planet_id, accomodation_id, start_date, end_date in rows:
+        booked = bookings.setdefault((planet_id, accomodation_id), [])
+
+        if start_date:
+            booked.append((start_date, end_date))
+
+    free_windows          = {}
+    free_accomodation_ids = []
+
+    for (planet_id, accomodation_id), booked in bookings.items():
+        free_window = find_free_window(merge_intervals(booked), check_in, check_out, nights)
+
+        if not free_window:
+            continue
+
+        free_accomodation_ids.append(accomodation_id)
+
+        if planet_id not in free_windows or free_window < free_windows[planet_id]:
+            free_windows[planet_id] = free_window
+
+    return free_windows, free_accomodation_ids
+
+PRICE_FACET_BUCKETS = (0, 100000, 500000, 1000000, 5000000, None)
+
+def get_planet_facets(planets):
+    '''
+    planets : 필터가 적용된 PlanetSearchDocument 쿼리셋
+    (은하, 테마, 최저가 구간)으로 한 번 GROUP BY 한 뒤 은하별, 테마별, 가격 구간별 행성 수로 나눠 더한다.
+    '''
+    buckets     = list(zip(PRICE_FACET_BUCKETS, PRICE_FACET_BUCKETS[1:]))
+    price_range = Case(
+        *[When(min_price__gte=low, min_price__lt=high, then=index) if high else When(min_price__gte=low, then=index)
+          for index, (low, high) in enumerate(buckets)],
+        output_field=IntegerField()
+    )
+
+    rows = planets.order_by()\
+                  .annotate(price_range=price_range)\
+                  .values('galaxy_id', 'galaxy_name', 'theme_id', 'theme_name', 'price_range')\
+                  .annotate(count=Count('planet_id'))
+
+    galaxies     = {}
+    themes       = {}
+    price_counts = [0] * len(buckets)
+
+    for row in rows:
+        galaxy = galaxies.setdefault(row['galaxy_id'], {'id' : row['galaxy_id'], 'name' : row['galaxy_name'], 'count' : 0})
+        theme  = themes.setdefault(row['theme_id'], {'id' : row['theme_id'], 'name' : row['theme_name'], 'count' : 0})
+
+        galaxy['count'] += row['count']
+        theme['count']  += row['count']
+
+        if row['price_range'] is not None:
+            price_counts[row['price_range']] += row['count']
+
+    return {
+        'galaxy' : sorted(galaxies.values(), key=lambda galaxy : galaxy['id']),
+        'theme'  : sorted(themes.values(), key=lambda theme : theme['id']),
+        'price'  : [{'min' : low, 'max' : high, 'count' : count} for (low, high), count in zip(buckets, price_counts)]
+    }
+
+def get_stay_price_subquery(nights, people, accomodations=None):
+    '''
+    행성(OuterRef('planet_id'))에서 people 명이 묵을 수 있는 숙소(accomodations 쿼리셋 중) 중 가장 싼 숙박 총액
+    price * nights + (people - min_of_people) * price * SURCHARGE_RATE, bookings.utils.check_validation_request 와 같은 계산
+    '''
+    price_field = DecimalField(max_digits=13, decimal_places=2)
+    # min_of_people 은 UNSIGNED 라 MySQL 에서 음수가 되는 뺄셈은 에러가 나므로, 인원이 더 많을 때만 뺀다.
+    surcharge   = Case(
+        When(min_of_people__lt=people, then=(Value(people) - F('min_of_people')) * F('price') * Value(Decimal(str(SURCHARGE_RATE)), output_field=price_field)),
+        default=Value(Decimal(0), output_field=price_field),
+        output_field=price_field
+    )
+
+    if accomodations is None:
+        accomodations = Accomodation.objects.all()
+
+    accomodations = accomodations.filter(planet_id=OuterRef('planet_id'), max_of_people__gte=people)\
+                                 .annotate(stay_price=ExpressionWrapper(F('price') * Value(nights) + surcharge, output_field=price_field))\
+                                 .order_by('stay_price')\
+                                 .values('stay_price')[:1]
+
+    return Subquery(accomodations, output_field=price_field)
@@ -1,7 +1,10 @@
-from datetime import datetime, timedelta
+from datetime import datetime
+from itertools import groupby
 
 from django.http import JsonResponse
-from django.db.models import Q
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.utils.http import parse_etags
 from django.core.exceptions import ValidationError
 
 from rest_framework import status
@@ -10,66 +13,190 @@ from rest_framework.response import Response
 
 from drf_yasg.utils import swagger_auto_schema
 
-from planets.models import Planet, Accomodation
+from core.utils import paginate_by_segments, optimize_for_serializer
+from users.utils import get_user_id
+from planets.models import Accomodation, PlanetSearchDocument
+from bookings.holds import hold_store
+from bookings.models import Booking, BookingNight
 
-from .utils import check_valid_date
+from .availability import merge_intervals, clip_intervals, compress_dates
+from .utils import check_valid_date, get_window_booking_relation, get_planet_facets, get_stay_price_subquery, get_calendar_window, get_flexible_window, find_planet_free_windows, parse_availability_checks, check_availability_batch, search_planet_ids, get_planet_search_cache_key, get_accomodation_etag, NAME_GRAM_SIZE, PLANET_SEARCH_CACHE_TIMEOUT, MAX_SEARCH_NIGHTS
 from .swagger import PlanetSwaager
-from .serializers import PlanetSerializer, PlanetDetailSerializer
+from .serializers import get_booked_intervals, PlanetSerializer, PlanetDetailSerializer, PlanetSearchDocumentSerializer, AvailabilityBatchSchemaSerializer
 
 class PlanetsView(APIView):
     @swagger_auto_schema(manual_parameters=[PlanetSwaager.check_in,
                                             PlanetSwaager.check_out,
                                             PlanetSwaager.sort,
                                             PlanetSwaager.limit,
-                                            PlanetSwaager.offset],
+                                            PlanetSwaager.offset,
+                                            PlanetSwaager.cursor,
+                                            PlanetSwaager.month,
+                                            PlanetSwaager.nights,
+                                            PlanetSwaager.facets],
                          responses={200 : PlanetSerializer, 400 : "Invalid Reason Message"}, tags=["Planet"])
     def get(self, request):
-        check_in  = request.GET.get('check-in')
-        check_out = request.GET.get('check-out')
-        sort      = request.GET.get('sort', 'id')
-        limit     = int(request.GET.get('limit', 10))
-        offset    = int(request.GET.get('offset', 0))
+        '''
+        nights 가 있으면 check-in/check-out 대신 month 안의 아무 nights박 빈 기간으로 찾고, 행성마다 가장 이른 free_window 를 붙인다.
+        facets=1 이면 목록을 results 에 담고 facets 를 함께 준다. (같은 캐시에 저장)
+        기간이 있으면 people 명(기본 1명)이 묵을 수 있는 가장 싼 숙소의 숙박 총액을 stay_price 로 붙인다.
+        '''
+        try:
+            check_in  = request.GET.get('check-in')
+            check_out = request.GET.get('check-out')
+            nights    = request.GET.get('nights')
+
+            if nights:
+                check_in, check_out, nights = get_flexible_window(request.GET.get('month'), nights)
+
+            elif check_in and check_out:
+                if check_in >= check_out:
+                    raise ValidationError('Invalid Date')
+
+                check_in  = datetime.strptime(check_in, '%Y-%m-%d').date()
+                check_out = datetime.strptime(check_out, '%Y-%m-%d').date()
+
+                # 캐시 키에 밤마다 세대 키가 들어가므로 기간을 제한한다.
+                if (check_out - check_in).days > MAX_SEARCH_NIGHTS:
+                    raise ValidationError('Invalid Date')
+
+            else:
+                check_in, check_out = None, None
+
+            cache_key = get_planet_search_cache_key(request.GET, check_in, check_out)
+            data      = cache.get(cache_key)
+
+            if data is None:
+                data = self.search(request.GET, check_in, check_out, nights)
+
+                cache.set(cache_key, data, PLANET_SEARCH_CACHE_TIMEOUT)
+
+            return Response(data=data, status=status.HTTP_200_OK)
+
+        except ValidationError as error:
+            return JsonResponse({'message' : error.message}, status=status.HTTP_400_BAD_REQUEST)
+
+    def search(self, params, check_in, check_out, nights=None):
+        sort   = params.get('sort', 'id')
+        limit  = int(params.get('limit', 10))
+        offset = int(params.get('offset', 0))
+        cursor = params.get('cursor')
 
         filter_options = {
             'galaxy'    : 'galaxy_id',
             'theme'     : 'theme_id',
-            'searching' : 'name__icontains',
-            'people'    : 'accomodation__max_of_people__gte',
-            'min-price' : 'accomodation__price__gte',
-            'max-price' : 'accomodation__price__lte'
+            'people'    : 'max_of_people__gte',
+            'min-price' : 'max_price__gte',
+            'max-price' : 'min_price__lte'
+        }
+
+        accomodation_filter_options = {
+            'people'    : 'max_of_people__gte',
+            'min-price' : 'price__gte',
+            'max-price' : 'price__lte'
         }
 
-        filter_set = {filter_options.get(key) : value for key, value in request.GET.items() if filter_options.get(key)}
+        filter_set              = {filter_options.get(key) : value for key, value in params.items() if filter_options.get(key)}
+        accomodation_filter_set = {accomodation_filter_options.get(key) : value for key, value in params.items() if accomodation_filter_options.get(key)}
+
+        planets = PlanetSearchDocument.objects.filter(**filter_set)
+
+        # 문서의 최소/최대값 조건은 인덱스로 후보만 줄인다. 인원, 가격 조건을 한 숙소가 모두 만족하는지는 EXISTS로 확인
+        if accomodation_filter_set:
+            accomodations = Accomodation.objects.filter(planet_id=OuterRef('planet_id'), **accomodation_filter_set)
+            planets       = planets.filter(Exists(accomodations))
+
+        searching = params.get('searching')
+
+        if searching:
+            planets = planets.filter(planet_id__in=search_planet_ids(searching))
 
-        booking = Q()
+            if len(searching) > NAME_GRAM_SIZE:
+                planets = planets.filter(name__icontains=searching)
+
+        free_windows       = None
+        stay_accomodations = Accomodation.objects.filter(**accomodation_filter_set)
+
+        # 날짜 검색은 두 방식 모두 숙소 단위로 본다. 조건에 맞는 숙소 하나라도 비어 있으면 그 행성을 보여주고, stay_price 도 빈 숙소 중에서 고른다.
+        # hold 는 목록에서 빼지 않는다. hold 는 TTL 로 알림 없이 만료되어 검색 캐시를 무효화할 수 없으므로,
+        # 빼면 만료된 hold 때문에 캐시된 목록이 행성을 계속 숨긴다. 상세, 달력, 예약 가능 조회와 예약에서 막는다.
+
+        if nights:
+            free_windows, free_accomodation_ids = find_planet_free_windows(planets.values('planet_id'), check_in, check_out, nights,
+                                                                           params.get('people'), params.get('min-price'), params.get('max-price'))
+
+            stay_accomodations = stay_accomodations.filter(id__in=free_accomodation_ids)
+
+            planets = planets.filter(planet_id__in=list(free_windows))
+
+        elif check_in and check_out:
+            booked_nights = BookingNight.objects.filter(accomodation_id=OuterRef('id'),
+                                                        date__gte=check_in,
+                                                        date__lt=check_out)
+
+            stay_accomodations = stay_accomodations.exclude(Exists(booked_nights))
+
+            planets = planets.filter(Exists(stay_accomodations.filter(planet_id=OuterRef('planet_id'))))
+
+        facets = get_planet_facets(planets) if params.get('facets') == '1' else None
 
         if check_in and check_out:
-            if check_in >= check_out:
-                return JsonResponse({'message':'Invalid Date'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                people = int(params.get('people') or 1)
 
-            check_in  = datetime.strptime(check_in, '%Y-%m-%d')
-            check_out = datetime.strptime(check_out, '%Y-%m-%d')
+            except ValueError:
+                raise ValidationError('Invalid People')
 
-            booking |= Q(booking__start_date__range=(check_in, check_out-timedelta(days=1)))
-            booking |= Q(booking__end_date__range=(check_in+timedelta(days=1), check_out))
+            planets = planets.annotate(stay_price=get_stay_price_subquery(nights or (check_out - check_in).days, people, stay_accomodations))
 
         sort_type = {
-            'id'   : 'id',
+            'id'   : 'planet_id',
             'new'  : '-created_at',
-            'desc' : '-accomodation__price',
-            'asc'  : 'accomodation__price' 
+            'desc' : '-max_price',
+            'asc'  : 'min_price'
+        }
+
+        if cursor is None:
+            planets = planets.order_by(sort_type[sort], 'planet_id')[offset:offset+limit]
+
+            data = self.serialize(planets, free_windows)
+
+            return {'results' : data, 'facets' : facets} if facets else data
+
+        # 가격 정렬은 가격이 없는(NULL) 행성을 따로 구간으로 나눠, 구간마다 가격/PK 인덱스 범위만 읽는다. (offset 정렬과 같은 NULL 위치)
+        cursor_segments = {
+            'id'   : [(planets, ['planet_id'])],
+            'new'  : [(planets, ['-created_at', '-planet_id'])],
+            'desc' : [(planets.filter(max_price__isnull=False), ['-max_price', '-planet_id']),
+                      (planets.filter(max_price__isnull=True), ['planet_id'])],
+            'asc'  : [(planets.filter(min_price__isnull=True), ['planet_id']),
+                      (planets.filter(min_price__isnull=False), ['min_price', 'planet_id'])]
+        }
+
+        planets, next_cursor, prev_cursor = paginate_by_segments(cursor_segments[sort], cursor, limit)
+
+        data = {
+            'results' : self.serialize(planets, free_windows),
+            'next'    : next_cursor,
+            'prev'    : prev_cursor
         }
 
-        planets = Planet.objects.prefetch_related('accomodation_set')\
-                                .prefetch_related('booking_set')\
-                                .filter(**filter_set)\
-                                .exclude(booking)\
-                                .order_by(sort_type[sort])[offset:offset+limit]
+        if facets:
+            data['facets'] = facets
+
+        return data
 
-        serializer = PlanetSerializer(planets, many=True)
+    def serialize(self, planets, free_windows=None):
+        data = PlanetSearchDocumentSerializer(planets, many=True).data
 
+        if free_windows is None:
+            return data
 
-        return Response(data=serializer.data, status=status.HTTP_200_OK)
+        for planet in data:
+            check_in, check_out   = free_windows[planet['id']]
+            planet['free_window'] = {'check_in' : check_in.isoformat(), 'check_out' : check_out.isoformat()}
+
+        return data
 
 class PlanetDetailView(APIView):
     @swagger_auto_schema(manual_parameters=[PlanetSwaager.check_in,
@@ -82,16 +209,141 @@ class PlanetDetailView(APIView):
             check_in  = request.GET.get('check-in')
             check_out = request.GET.get('check-out')
 
-            accomodation = Accomodation.objects.prefetch_related('accomodationimage_set').select_related('planet').get(id=accomodation_id, planet_id=planet_id)
+            user_id = get_user_id(request)
+            etag    = get_accomodation_etag(planet_id, accomodation_id, request.GET, user_id)
+
+            if etag is None:
+                raise Accomodation.DoesNotExist
 
-            serializer = PlanetDetailSerializer(accomodation)
+            if etag in parse_etags(request.headers.get('If-None-Match', '')):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag' : etag})
 
-            new_serializer_data = check_valid_date(check_in, check_out, serializer.data)
+            accomodation = optimize_for_serializer(Accomodation.objects.all(), PlanetDetailSerializer).get(id=accomodation_id, planet_id=planet_id)
 
-            return Response(data=new_serializer_data, status=status.HTTP_200_OK)
+            booked_intervals = get_booked_intervals(accomodation)
+
+            serializer = PlanetDetailSerializer(accomodation, context={'booked_intervals' : booked_intervals})
+
+            new_serializer_data = check_valid_date(check_in, check_out, serializer.data, booked_intervals, accomodation.id, user_id)
+
+            return Response(data=new_serializer_data, status=status.HTTP_200_OK, headers={'ETag' : etag})
 
         except Accomodation.DoesNotExist:
             return JsonResponse({'message' : 'Invalid Accomodation'}, status=status.HTTP_400_BAD_REQUEST)
         
         except ValidationError as error:
-            return JsonResponse({'message' : error.message}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            return JsonResponse({'message' : error.message}, status=status.HTTP_400_BAD_REQUEST)
+
+class AccomodationCalendarView(APIView):
+    @swagger_auto_schema(manual_parameters=[PlanetSwaager.month,
+                                            PlanetSwaager.months,
+                                            PlanetSwaager.planet_id,
+                                            PlanetSwaager.accomodation_id],
+                         responses={200 : "Blocked Date Ranges", 400 : "Invalid Reason Message"}, tags=["Planet"])
+    def get(self, request, planet_id, accomodation_id):
+        '''
+        예약되었거나 결제 중인(hold) 기간을 [start, end) 구간으로 월 단위 페이지로 돌려준다. next 는 다음 페이지의 month
+        '''
+        try:
+            start, end, next_month = get_calendar_window(request.GET.get('month'), request.GET.get('months'))
+
+            if not Accomodation.objects.filter(id=accomodation_id, planet_id=planet_id).exists():
+                raise Accomodation.DoesNotExist
+
+            bookings = list(Booking.objects.active().filter(accomodation_id=accomodation_id, start_date__lt=end, end_date__gt=start)
+                                                   .values_list('start_date', 'end_date'))
+            holds    = compress_dates(hold_store.get_held_nights([(accomodation_id, start, end)])[accomodation_id])
+
+            blocked = [[blocked_start.isoformat(), blocked_end.isoformat()]
+                       for blocked_start, blocked_end in clip_intervals(merge_intervals(bookings + holds), start, end)]
+
+            result = {
+                'start'   : start.isoformat(),
+                'end'     : end.isoformat(),
+                'blocked' : blocked,
+                'next'    : next_month
+            }
+
+            return Response(data=result, status=status.HTTP_200_OK)
+
+        except Accomodation.DoesNotExist:
+            return JsonResponse({'message' : 'Invalid Accomodation'}, status=status.HTTP_400_BAD_REQUEST)
+
+        except ValidationError as error:
+            return JsonResponse({'message' : error.message}, status=status.HTTP_400_BAD_REQUEST)
+
+class PlanetAvailabilityView(APIView):
+    @swagger_auto_schema(manual_parameters=[PlanetSwaager.month,
+                                            PlanetSwaager.months,
+                                            PlanetSwaager.planet_id],
+                         responses={200 : "Blocked Date Ranges By Accomodation", 400 : "Invalid Reason Message"}, tags=["Planet"])
+    def get(self, request, planet_id):
+        '''
+        행성의 모든 숙소에 대해 예약된 기간을 [start, end) 구간으로 돌려준다.
+        숙소에 기간 안의 예약만 LEFT JOIN 해서 쿼리 한 번으로 가져온 뒤 숙소별로 묶는다. 결제 중인 hold 는 get_many 한 번으로 더한다.
+        '''
+        try:
+            start, end, next_month = get_calendar_window(request.GET.get('month'), request.GET.get('months'))
+
+            rows = Accomodation.objects.filter(planet_id=planet_id)\
+                                       .annotate(window_booking=get_window_booking_relation(start, end))\
+                                       .order_by('id')\
+                                       .values_list('id', 'name', 'window_booking__start_date', 'window_booking__end_date')
+
+            accomodations = []
+
+            for (accomodation_id, name), bookings in groupby(rows, key=lambda row : row[:2]):
+                accomodations.append({
+                    'id'        : accomodation_id,
+                    'name'      : name,
+                    'intervals' : [(start_date, end_date) for _, _, start_date, end_date in bookings if start_date]
+                })
+
+            if not accomodations:
+                return JsonResponse({'message' : 'Invalid Planet'}, status=status.HTTP_400_BAD_REQUEST)
+
+            held_nights = hold_store.get_held_nights([(accomodation['id'], start, end) for accomodation in accomodations])
+
+            for accomodation in accomodations:
+                intervals = merge_intervals(accomodation.pop('intervals') + compress_dates(held_nights[accomodation['id']]))
+
+                accomodation['blocked'] = [[blocked_start.isoformat(), blocked_end.isoformat()]
+                                           for blocked_start, blocked_end in clip_intervals(intervals, start, end)]
+
+            result = {
+                'start'         : start.isoformat(),
+                'end'           : end.isoformat(),
+                'accomodations' : accomodations,
+                'next'          : next_month
+            }
+
+            return Response(data=result, status=status.HTTP_200_OK)
+
+        except ValidationError as error:
+            return JsonResponse({'message' : error.message}, status=status.HTTP_400_BAD_REQUEST)
+
+class AvailabilityBatchView(APIView):
+    @swagger_auto_schema(request_body=AvailabilityBatchSchemaSerializer,
+                         responses={200 : "Availability By Check", 400 : "Invalid Reason Message"}, tags=["Planet"])
+    def post(self, request):
+        '''
+        (accomodation_id, check_in, check_out) 목록의 예약 가능 여부를 요청 순서대로 돌려준다. 최대 MAX_AVAILABILITY_BATCH_SIZE 개
+        '''
+        try:
+            checks       = parse_availability_checks(request.data.get('checks') if isinstance(request.data, dict) else None)
+            availability = check_availability_batch(checks)
+
+            results = [{
+                'accomodation_id' : accomodation_id,
+                'check_in'        : check_in.isoformat(),
+                'check_out'       : check_out.isoformat(),
+                'available'       : available
+            } for (accomodation_id, check_in, check_out), available in zip(checks, availability)]
+
+            return Response(data={'results' : results}, status=status.HTTP_200_OK)
+
+        except Accomodation.DoesNotExist:
+            return JsonResponse({'message' : 'Invalid Accomodation'}, status=status.HTTP_400_BAD_REQUEST)
+
+        except ValidationError as error:
+            return JsonResponse({'message' : error.message}, status=status.HTTP_400_BAD_REQUEST)
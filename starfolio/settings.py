@@ -90,6 +90,21 @@ WSGI_APPLICATION = 'starfolio.wsgi.application'
 
 DATABASES = DATABASES
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# Planet search invalidation counters live in this cache, so use a shared backend (memcached, redis) when running several processes.
+# Checkout holds (bookings.holds) live in the 'holds' cache. FileBasedCache works for a single host, use redis/memcached for several hosts.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'holds': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'holds',
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -154,6 +169,11 @@ CORS_ALLOW_HEADERS = (
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'if-none-match',
+)
+
+CORS_EXPOSE_HEADERS = (
+    'etag',
 )
 
 APPEND_SLASH = False
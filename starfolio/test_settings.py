@@ -0,0 +1,20 @@
+'''
+row lock 이 되는 DB 에서 테스트를 돌릴 때 쓰는 설정. BookingConcurrencyTest 는 SQLite 에서 건너뛴다.
+
+docker compose -f docker-compose.test.yml up -d
+python manage.py test bookings.tests.BookingConcurrencyTest --settings=starfolio.test_settings
+'''
+import os
+
+from .settings import *
+
+DATABASES = {
+    'default': {
+        'ENGINE'   : os.environ.get('TEST_DB_ENGINE', 'django.db.backends.mysql'),
+        'NAME'     : os.environ.get('TEST_DB_NAME', 'starfolio'),
+        'USER'     : os.environ.get('TEST_DB_USER', 'root'),
+        'PASSWORD' : os.environ.get('TEST_DB_PASSWORD', 'starfolio'),
+        'HOST'     : os.environ.get('TEST_DB_HOST', '127.0.0.1'),
+        'PORT'     : os.environ.get('TEST_DB_PORT', '3306')
+    }
+}
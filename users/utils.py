@@ -37,4 +37,14 @@ def login_decorator(func):
         except KeyError:
            return JsonResponse({"message" : "Invalid User"}, status=status.HTTP_400_BAD_REQUEST)
 
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+def get_user_id(request):
+    '''
+    로그인이 필요 없는 API에서 쓴다. Authorization 토큰이 유효하면 user id, 없거나 유효하지 않으면 None (DB 조회 없음)
+    '''
+    try:
+        return jwt.decode(request.headers.get('Authorization'), SECRET_KEY, ALGORITHM).get('id')
+
+    except (jwt.exceptions.InvalidTokenError, AttributeError):
+        return None
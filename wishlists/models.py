@@ -8,3 +8,6 @@ class WishList(TimeStamp):
 
     class Meta:
         db_table = 'wishlists'
+        indexes  = [
+            models.Index(fields=['user', 'created_at'], name='wishlists_user_created_idx'),
+        ]
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from planets.serializers import PlanetSerializer
+from planets.serializers import PlanetSerializer, PLANET_VALUES, serialize_planet_rows
 
 from .models import WishList
 
@@ -23,6 +23,22 @@ class WishListDetailSerializer(serializers.ModelSerializer):
         model = WishList
         fields = ('id', 'planet')
 
+WISHLIST_VALUES = ('id',) + tuple(f'planet__{field}' for field in PLANET_VALUES)
+
+def serialize_wishlists(wishlists):
+    '''
+    WishListDetailSerializer(wishlists, many=True).data 와 같은 결과를 .values()로 만든다. [읽기 전용]
+    '''
+    return serialize_wishlist_rows(list(wishlists.values(*WISHLIST_VALUES)))
+
+def serialize_wishlist_rows(wishlist_rows):
+    '''
+    wishlist_rows : WISHLIST_VALUES 키를 가진 dict 리스트
+    '''
+    planets = serialize_planet_rows([{field : wishlist[f'planet__{field}'] for field in PLANET_VALUES} for wishlist in wishlist_rows])
+
+    return [{'id' : wishlist['id'], 'planet' : planet} for wishlist, planet in zip(wishlist_rows, planets)]
+
 class WishSerializer(serializers.Serializer):
     '''
     Wishlist 스키마 시리얼라이저[only used for swagger]
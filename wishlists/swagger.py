@@ -2,4 +2,5 @@ from drf_yasg import openapi
 
 class WishListSwaager:
     offset = openapi.Parameter('offset', openapi.IN_QUERY, required=False, type=openapi.TYPE_INTEGER)
-    limit  = openapi.Parameter('limit', openapi.IN_QUERY, required=False, type=openapi.TYPE_INTEGER)
\ No newline at end of file
+    limit  = openapi.Parameter('limit', openapi.IN_QUERY, required=False, type=openapi.TYPE_INTEGER)
+    cursor = openapi.Parameter('cursor', openapi.IN_QUERY, required=False, type=openapi.TYPE_STRING)
\ No newline at end of file
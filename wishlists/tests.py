@@ -5,10 +5,12 @@ import bcrypt
 import jwt
 
 from rest_framework.test import APITestCase, APIClient
+from rest_framework.renderers import JSONRenderer
 
 from users.models import User
 from planets.models import Galaxy, PlanetTheme, Planet, Accomodation
 from wishlists.models import WishList
+from wishlists.serializers import WishListDetailSerializer, serialize_wishlists
 from starfolio.settings import SECRET_KEY, ALGORITHM
 
 class WishListTest(APITestCase):
@@ -144,6 +146,46 @@ class WishListTest(APITestCase):
             ]
         )
     
+    def test_success_wishlist_view_with_cursor(self):
+        '''
+        커서로 장바구니 넘겨보기
+        '''
+        WishList.objects.create(
+            id        = 2,
+            user_id   = 1,
+            planet_id = 2
+        )
+
+        response = self.f_client.get('/api/wishlists?limit=1&cursor=')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([wishlist['id'] for wishlist in response.json()['results']], [1])
+
+        response = self.f_client.get(f'/api/wishlists?limit=1&cursor={response.json()["next"]}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([wishlist['id'] for wishlist in response.json()['results']], [2])
+        self.assertIsNone(response.json()['next'])
+
+        response = self.f_client.get(f'/api/wishlists?limit=1&cursor={response.json()["prev"]}')
+
+        self.assertEqual([wishlist['id'] for wishlist in response.json()['results']], [1])
+        self.assertIsNone(response.json()['prev'])
+
+    def test_success_serialize_wishlists_same_bytes_as_wishlist_detail_serializer(self):
+        WishList.objects.create(
+            id        = 2,
+            user_id   = 1,
+            planet_id = 2
+        )
+
+        wishlists = WishList.objects.filter(user_id=1).order_by('id')
+
+        self.assertEqual(
+            JSONRenderer().render(serialize_wishlists(wishlists)),
+            JSONRenderer().render(WishListDetailSerializer(wishlists, many=True).data)
+        )
+
     def test_success_wishlist_non_exist_wish_view(self):
         '''
         안담긴 장바구니 보기
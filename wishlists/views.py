@@ -1,4 +1,5 @@
 from django.http import JsonResponse
+from django.core.exceptions import ValidationError
 
 from rest_framework import status
 from rest_framework.views import APIView
@@ -6,11 +7,12 @@ from rest_framework.response import Response
 
 from drf_yasg.utils import swagger_auto_schema
 
+from core.utils import paginate_by_cursor
 from users.utils import login_decorator
 from wishlists.models import WishList
 
 from .swagger import WishListSwaager
-from .serializers import WishListSerializer, WishListDetailSerializer, WishSerializer
+from .serializers import WishListSerializer, WishSerializer, WISHLIST_VALUES, serialize_wishlists, serialize_wishlist_rows
 
 class WishListView(APIView):
     @swagger_auto_schema(request_body=WishSerializer, responses={201 : WishListSerializer, 400 : "Invalid Reason Message"}, tags=["WishList"])
@@ -36,19 +38,29 @@ class WishListView(APIView):
         except KeyError:
             return JsonResponse({'message':'Inavlid Required Value'}, status=status.HTTP_400_BAD_REQUEST)
     
-    @swagger_auto_schema(manual_parameters=[WishListSwaager.limit, WishListSwaager.offset],
+    @swagger_auto_schema(manual_parameters=[WishListSwaager.limit, WishListSwaager.offset, WishListSwaager.cursor],
                          responses={201 : WishListSerializer, 400 : "Invalid Reason Message"}, tags=["WishList"])
     @login_decorator
     def get(self, request):
         limit  = int(request.GET.get('limit', 3))
         offset = int(request.GET.get('offset', 0))
+        cursor = request.GET.get('cursor')
         user   = request.user
 
-        wishlists = WishList.objects.filter(user=user).select_related('planet')[offset:offset+limit]
+        wishlists = WishList.objects.filter(user=user)
 
-        if not wishlists:
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        if cursor is None:
+            wishlists = serialize_wishlists(wishlists.order_by('id')[offset:offset+limit])
 
-        serializer = WishListDetailSerializer(wishlists, many=True)
+            if not wishlists:
+                return Response(status=status.HTTP_204_NO_CONTENT)
 
-        return Response(data=serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+            return Response(data=wishlists, status=status.HTTP_200_OK)
+
+        try:
+            wishlists, next_cursor, prev_cursor = paginate_by_cursor(wishlists.values(*WISHLIST_VALUES, 'created_at'), ['created_at', 'id'], cursor, limit)
+
+        except ValidationError as error:
+            return JsonResponse({'message' : error.message}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(data={'results' : serialize_wishlist_rows(wishlists), 'next' : next_cursor, 'prev' : prev_cursor}, status=status.HTTP_200_OK)
\ No newline at end of file